@@ -0,0 +1,92 @@
+# async_downloader.py
+# asyncio download stage for ThumbnailMakerService
+# - one aiohttp session whose connector pools keep-alive connections per host
+# - a semaphore bounds the number of downloads in flight, so thousands of
+#   urls cost thousands of coroutines instead of thousands of threads
+# - responses are streamed to disk in chunks, every request has a timeout and
+#   transient failures are retried with exponential backoff
+import asyncio
+import logging
+import random
+
+import aiohttp
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class DownloadError(Exception):
+    pass
+
+
+class AsyncDownloader(object):
+    def __init__(self, max_concurrency=100, limit_per_host=8, timeout=30,
+                 retries=3, backoff=0.5, chunk_size=64 * 1024, keepalive_timeout=30):
+        self.max_concurrency = max_concurrency
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.chunk_size = chunk_size
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+        self._sem = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        self._session = None
+
+    def _retry_delay(self, attempt):
+        # exponential backoff with jitter so retries from many tasks spread out
+        return self.backoff * (2 ** attempt) * (0.5 + random.random() / 2)
+
+    async def _request(self, url, handle, headers=None):
+        """Run handle(response) for url, retrying transient failures."""
+        attempt = 0
+        while True:
+            try:
+                async with self._sem:
+                    async with self._session.get(url, headers=headers) as resp:
+                        if resp.status in RETRY_STATUSES:
+                            raise DownloadError("{} returned {}".format(url, resp.status))
+                        resp.raise_for_status()
+                        return await handle(resp)
+            except (aiohttp.ClientError, asyncio.TimeoutError, DownloadError) as exc:
+                if isinstance(exc, aiohttp.ClientResponseError) or attempt >= self.retries:
+                    raise
+                delay = self._retry_delay(attempt)
+                logging.warning("download of {} failed ({!r}), retrying in {:.2f} seconds".format(
+                    url, exc, delay))
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def fetch(self, url, headers=None):
+        """Return (data, response headers), data is None on a 304."""
+        async def handle(resp):
+            if resp.status == 304:
+                return None, resp.headers
+            return await resp.read(), resp.headers
+        return await self._request(url, handle, headers=headers)
+
+    async def download(self, url, dest_path):
+        """Stream url to dest_path and return the number of bytes written."""
+        async def handle(resp):
+            written = 0
+            with open(dest_path, 'wb') as f:
+                async for chunk in resp.content.iter_chunked(self.chunk_size):
+                    f.write(chunk)
+                    written += len(chunk)
+            return written
+        return await self._request(url, handle)
@@ -0,0 +1,185 @@
+# benchmark.py
+# reproducible benchmark of the ThumbnailMakerService concurrency variants
+# - a variant that writes fewer thumbnails than images * sizes is reported as
+#   incomplete and gets no img/s, so it cannot rank above variants that did the work
+# - synthetic JPEGs are generated from a fixed seed and served from a local
+#   http server, so runs do not depend on the network or on remote files
+# - every variant runs in a fresh child process, which isolates peak RSS and
+#   CPU time (including the variant's own worker processes)
+# - results are printed as a table and optionally written as JSON
+#
+# usage: python benchmark.py --count 24 --width 1920 --height 1080 --json results.json
+"""Benchmark the ThumbnailMakerService concurrency variants on synthetic
+images served from a local http server."""
+import argparse
+import functools
+import importlib
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from PIL import Image
+
+HERE = os.path.dirname(os.path.realpath(__file__))
+
+# the variants without a target_sizes attribute hard code these
+DEFAULT_TARGET_SIZES = (32, 64, 200)
+
+# name -> (module, ThumbnailMakerService keyword arguments)
+VARIANTS = {
+    'basic': ('thumbnail_maker_basic', {}),
+    'thread': ('thumbnail_maker_thread', {}),
+    'queue': ('thumbnail_maker_queue', {}),
+    'multiprocessing_queue': ('thumbnail_maker_multiprocessing_queue', {}),
+    'multiprocess': ('thumbnail_maker_multiprocess', {}),
+    'engine_thread_process': ('thumbnail_maker', dict(dl_executor='thread', resize_executor='process')),
+    'engine_asyncio_process': ('thumbnail_maker', dict(dl_executor='asyncio', resize_executor='process')),
+    'engine_in_memory': ('thumbnail_maker', dict(dl_executor='asyncio', resize_executor='process',
+                                                 in_memory=True)),
+}
+
+
+def generate_images(img_dir, count, width, height, seed):
+    """Write count synthetic photo-like JPEGs, identical for the same seed."""
+    rng = random.Random(seed)
+    for i in range(count):
+        # upscaled low resolution noise gives smooth gradients that compress like a photo
+        small = (max(width // 16, 1), max(height // 16, 1))
+        noise = Image.frombytes('RGB', small, rng.randbytes(small[0] * small[1] * 3))
+        img = noise.resize((width, height), Image.BICUBIC)
+        img.save(os.path.join(img_dir, 'synthetic-{:04d}.jpeg'.format(i)), quality=90)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def serve(img_dir):
+    handler = functools.partial(QuietHandler, directory=img_dir)
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_variant(name, urls, work_dir, seed):
+    """Run one variant in this process and return its measurements."""
+    # claim the root logger first so the variants' basicConfig calls write to
+    # the scratch dir instead of appending to logfile.log
+    logging.basicConfig(filename=os.path.join(work_dir, 'benchmark.log'), level=logging.INFO)
+    random.seed(seed)
+    module_name, options = VARIANTS[name]
+    module = importlib.import_module(module_name)
+    service = module.ThumbnailMakerService(home_dir=work_dir, **options)
+    # not every variant creates its own directories
+    os.makedirs(service.input_dir, exist_ok=True)
+    os.makedirs(service.output_dir, exist_ok=True)
+
+    cpu_start = os.times()
+    start = time.perf_counter()
+    service.make_thumbnails(urls)
+    wall = time.perf_counter() - start
+    cpu_end = os.times()
+
+    cpu = sum(cpu_end[:4]) - sum(cpu_start[:4])
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss_kb = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    thumbnails = len(os.listdir(service.output_dir))
+    # queue depth and wait times of the variants that keep StageMetrics
+    stages = [getattr(service, attr, None) for attr in ('dl_metrics', 'resize_metrics')]
+    expected = len(urls) * len(getattr(service, 'target_sizes', DEFAULT_TARGET_SIZES))
+    complete = thumbnails >= expected
+    return {
+        'variant': name,
+        'images': len(urls),
+        'thumbnails': thumbnails,
+        'expected_thumbnails': expected,
+        'complete': complete,
+        'wall_time': wall,
+        'cpu_time': cpu,
+        'peak_rss_mb': peak_rss_kb / 1024.0,
+        # a variant that skipped work has no meaningful throughput
+        'images_per_second': len(urls) / wall if wall and complete else None,
+        'stages': {stage.name: stage.as_dict() for stage in stages if stage is not None},
+    }
+
+
+def run_in_child(name, urls, seed):
+    with tempfile.TemporaryDirectory() as work_dir:
+        cmd = [sys.executable, os.path.realpath(__file__), '--run-variant', name,
+               '--work-dir', work_dir, '--seed', str(seed)]
+        proc = subprocess.run(cmd, input=json.dumps(urls), capture_output=True,
+                              text=True, cwd=HERE)
+    if proc.returncode != 0:
+        return {'variant': name, 'error': proc.stderr.strip().splitlines()[-1:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def format_table(results):
+    header = '{:<24} {:>7} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+        'variant', 'images', 'thumbs', 'wall s', 'cpu s', 'rss MB', 'img/s')
+    lines = [header, '-' * len(header)]
+    for r in results:
+        if 'error' in r:
+            lines.append('{:<24} failed: {}'.format(r['variant'], ' '.join(r['error'])))
+            continue
+        if not r['complete']:
+            lines.append('{:<24} {:>7} {:>7} incomplete: expected {} thumbnails'.format(
+                r['variant'], r['images'], r['thumbnails'], r['expected_thumbnails']))
+            continue
+        lines.append('{:<24} {:>7} {:>7} {:>9.3f} {:>9.3f} {:>9.1f} {:>9.2f}'.format(
+            r['variant'], r['images'], r['thumbnails'], r['wall_time'],
+            r['cpu_time'], r['peak_rss_mb'], r['images_per_second']))
+    return '\n'.join(lines)
+
+
+def benchmark(variants, count, width, height, seed):
+    with tempfile.TemporaryDirectory() as img_dir:
+        generate_images(img_dir, count, width, height, seed)
+        server = serve(img_dir)
+        try:
+            urls = ['http://127.0.0.1:{}/{}'.format(server.server_port, name)
+                    for name in sorted(os.listdir(img_dir))]
+            return [run_in_child(name, urls, seed) for name in variants]
+        finally:
+            server.shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, default=24, help='number of images')
+    parser.add_argument('--width', type=int, default=1920)
+    parser.add_argument('--height', type=int, default=1080)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--variants', nargs='+', choices=sorted(VARIANTS), default=list(VARIANTS))
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--run-variant', help=argparse.SUPPRESS)
+    parser.add_argument('--work-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_variant:
+        # child mode: urls arrive on stdin, measurements leave on stdout
+        urls = json.loads(sys.stdin.read())
+        print(json.dumps(run_variant(args.run_variant, urls, args.work_dir, args.seed)))
+        return
+
+    results = benchmark(args.variants, args.count, args.width, args.height, args.seed)
+    print(format_table(results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'count': args.count, 'width': args.width, 'height': args.height,
+                       'seed': args.seed, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# bounded_executor.py
+# stream any number of items through a thread or process pool without
+# submitting them all up front
+# - at most max_in_flight tasks are pending at any time, so memory stays flat
+#   no matter how long the input iterable is
+# - results come back in input order or as they complete
+# - tiny tasks can be batched into chunks to amortize the per-task overhead
+#   (most noticeable with process pools, where every task is pickled)
+import collections
+import itertools
+
+from concurrent.futures import (
+    Executor, ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait,
+)
+
+
+def run_chunk(fn, chunk):
+    # module level so process pools can pickle it
+    return [fn(item) for item in chunk]
+
+
+def chunked(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def create_executor(kind, max_workers=None):
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=max_workers)
+    if kind == 'process':
+        return ProcessPoolExecutor(max_workers=max_workers)
+    raise ValueError("executor must be 'thread' or 'process', got {!r}".format(kind))
+
+
+def bounded_map(fn, iterable, executor='thread', max_workers=None, max_in_flight=None,
+                ordered=True, chunksize=1):
+    """Yield fn(item) for every item of iterable.
+    executor is 'thread', 'process' or an existing Executor, which is left
+    running. At most max_in_flight chunks (default: twice the worker count)
+    are submitted but not yet consumed. With ordered=False results are
+    yielded as soon as they complete.
+    """
+    own_executor = not isinstance(executor, Executor)
+    if own_executor:
+        executor = create_executor(executor, max_workers)
+    if max_in_flight is None:
+        max_in_flight = 2 * (getattr(executor, '_max_workers', None) or 4)
+    if max_in_flight < 1:
+        raise ValueError("max_in_flight must be at least 1")
+
+    chunks = chunked(iterable, chunksize)
+    pending = collections.deque() if ordered else set()
+
+    def submit_next():
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        future = executor.submit(run_chunk, fn, chunk)
+        if ordered:
+            pending.append(future)
+        else:
+            pending.add(future)
+        return True
+
+    try:
+        # fill the window
+        while len(pending) < max_in_flight and submit_next():
+            pass
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                pending.difference_update(done)
+            for future in done:
+                # top the window back up before handing results to the caller
+                submit_next()
+                for result in future.result():
+                    yield result
+    finally:
+        # the caller stopped early or a task raised, drop what has not started
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=True)
@@ -0,0 +1,199 @@
+# crawler.py
+# asyncio replacement for the download_all_sites variants in concurrency.py
+# (thread-local requests sessions, one session per process)
+# - one aiohttp session for the whole crawl: the connector caps connections
+#   overall and per host and caches DNS lookups
+# - an optional token bucket caps requests per second across all hosts
+# - at most max_connections requests are in flight, so 10k+ urls cost a
+#   window of coroutines instead of one thread or task per url
+# - bodies are streamed in chunks to an optional sink instead of held in memory
+# - every request's latency goes into a histogram, overall and per host
+# - download_all_sites() is a blocking wrapper for existing callers
+import asyncio
+import bisect
+import collections
+import time
+
+from urllib.parse import urlsplit
+
+import aiohttp
+
+# upper bounds in seconds, 1 ms doubling up to about 33 s, plus an overflow bucket
+LATENCY_BUCKETS = tuple(0.001 * 2 ** i for i in range(16))
+
+CrawlResult = collections.namedtuple('CrawlResult', 'url status size elapsed error')
+
+
+class RateLimiter(object):
+    """Token bucket shared by every request of a crawl: rate tokens per
+    second, up to burst tokens saved up."""
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # the lock makes waiters take tokens in arrival order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class LatencyHistogram(object):
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, pct):
+        """Upper bound of the bucket holding the pct-th percentile."""
+        if not self.count:
+            return 0.0
+        rank = pct / 100 * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'buckets': dict(zip(self.buckets + (float('inf'),), self.counts)),
+        }
+
+    def __str__(self):
+        return "{} requests, mean {:.3f} s, p50 {:.3f} s, p90 {:.3f} s, p99 {:.3f} s, " \
+            "max {:.3f} s".format(self.count, self.mean, self.percentile(50),
+                                  self.percentile(90), self.percentile(99), self.max)
+
+
+class Crawler(object):
+    def __init__(self, max_connections=100, limit_per_host=8, rate=None, burst=None,
+                 timeout=30, ttl_dns_cache=300, chunk_size=64 * 1024):
+        self.max_connections = max_connections
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.ttl_dns_cache = ttl_dns_cache
+        self.chunk_size = chunk_size
+        self.rate = rate
+        self.burst = burst
+        self.latency = LatencyHistogram()
+        self.host_latency = collections.defaultdict(LatencyHistogram)
+        self._session = None
+        self._limiter = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.max_connections,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.ttl_dns_cache,
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        # created here so it binds to the running loop
+        self._limiter = RateLimiter(self.rate, self.burst) if self.rate else None
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        self._session = None
+
+    async def fetch(self, url, sink=None):
+        """Stream url and return a CrawlResult. sink(url, chunk) is called for
+        every chunk of the body; failures are returned, not raised, so one bad
+        site does not stop the crawl."""
+        if self._limiter is not None:
+            await self._limiter.acquire()
+        start = time.perf_counter()
+        status, size, error = None, 0, None
+        try:
+            async with self._session.get(url) as response:
+                status = response.status
+                async for chunk in response.content.iter_chunked(self.chunk_size):
+                    size += len(chunk)
+                    if sink is not None:
+                        sink(url, chunk)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            error = exc
+        elapsed = time.perf_counter() - start
+        self.latency.record(elapsed)
+        self.host_latency[urlsplit(url).netloc].record(elapsed)
+        return CrawlResult(url, status, size, elapsed, error)
+
+    async def crawl(self, urls, sink=None):
+        """Yield a CrawlResult for every url as it completes. urls may be any
+        iterable and is consumed lazily."""
+        urls = iter(urls)
+        pending = set()
+
+        def fill():
+            while len(pending) < self.max_connections:
+                url = next(urls, None)
+                if url is None:
+                    return
+                pending.add(asyncio.ensure_future(self.fetch(url, sink)))
+
+        fill()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.difference_update(done)
+                fill()
+                for task in done:
+                    yield task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def download_all_sites(sites, sink=None, **options):
+    """Blocking wrapper: crawl sites and return (results, crawler). The
+    crawler carries the latency histograms."""
+    async def main():
+        async with Crawler(**options) as crawler:
+            return [result async for result in crawler.crawl(sites, sink)], crawler
+    return asyncio.run(main())
+
+
+if __name__ == '__main__':
+    sites = [
+        "https://www.jython.org",
+        "http://olympus.realpython.org/dice",
+    ] * 80
+    start_time = time.time()
+    results, crawler = download_all_sites(sites)
+    duration = time.time() - start_time
+    print("Downloaded {} sites in {:.2f} seconds".format(len(results), duration))
+    print(crawler.latency)
@@ -0,0 +1,123 @@
+# hash_service.py
+# bulk hashing on a process pool without pickling the data being hashed
+# (concurrency.py's generate_hash example sends every text to a worker and back)
+# - files: workers receive a path and mmap the file themselves
+# - byte blobs: the parent copies them into one shared memory block and
+#   workers hash slices of it in place
+# - one huge file: tree_hash splits it into mmapped ranges hashed in parallel
+#   and combines the chunk digests into a root digest
+# hashlib releases the GIL for large buffers, so the same functions also work
+# on a thread pool; the process pool is used to spread work over every core
+import hashlib
+import mmap
+import os
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+# prefixes keep chunk digests and the root digest in separate domains, so a
+# chunk can never be passed off as a list of chunk digests
+LEAF_PREFIX = b'\x00'
+NODE_PREFIX = b'\x01'
+
+
+def new_hash(algorithm):
+    # shake_* digests have no fixed length, so they are not supported
+    if algorithm not in hashlib.algorithms_available or algorithm.startswith('shake_'):
+        raise ValueError("unsupported hash algorithm {!r}".format(algorithm))
+    return hashlib.new(algorithm)
+
+
+def hash_file_range(path, algorithm, offset=0, length=None, prefix=b''):
+    """Hash length bytes of path starting at offset through an mmap.
+    offset must be a multiple of mmap.ALLOCATIONGRANULARITY."""
+    h = new_hash(algorithm)
+    h.update(prefix)
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if length is None:
+            length = size - offset
+        if length > 0:
+            with mmap.mmap(f.fileno(), length, access=mmap.ACCESS_READ, offset=offset) as m:
+                h.update(m)
+    return h
+
+
+def hash_file(path, algorithm):
+    return hash_file_range(path, algorithm).hexdigest()
+
+
+def hash_shared(shm_name, offset, length, algorithm):
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        view = shm.buf[offset:offset + length]
+        try:
+            h = new_hash(algorithm)
+            h.update(view)
+        finally:
+            view.release()
+    finally:
+        shm.close()
+    return h.hexdigest()
+
+
+def hash_leaf(path, algorithm, offset, length):
+    return hash_file_range(path, algorithm, offset, length, prefix=LEAF_PREFIX).digest()
+
+
+def hash_files(paths, algorithm='sha256', max_workers=None):
+    """Return {path: hexdigest}, one file per task."""
+    paths = list(paths)
+    new_hash(algorithm)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        digests = executor.map(hash_file, paths, [algorithm] * len(paths))
+        return dict(zip(paths, digests))
+
+
+def hash_blobs(blobs, algorithm='sha256', max_workers=None):
+    """Return the hexdigest of every blob, in order.
+    The blobs are copied once into a shared memory block, workers only
+    receive (block name, offset, length)."""
+    blobs = [memoryview(blob).cast('B') for blob in blobs]
+    new_hash(algorithm)
+    total = sum(len(blob) for blob in blobs)
+    shm = shared_memory.SharedMemory(create=True, size=max(total, 1))
+    try:
+        offsets = []
+        offset = 0
+        for blob in blobs:
+            shm.buf[offset:offset + len(blob)] = blob
+            offsets.append(offset)
+            offset += len(blob)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(hash_shared, shm.name, offset, len(blob), algorithm)
+                       for offset, blob in zip(offsets, blobs)]
+            return [future.result() for future in futures]
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def tree_hash(path, algorithm='sha256', chunk_size=DEFAULT_CHUNK_SIZE, max_workers=None):
+    """Hash one large file in parallel.
+    Every chunk_size range is hashed as H(0x00 + chunk) and the root is
+    H(0x01 + chunk digests...). The result depends on chunk_size and is not
+    the plain digest of the file, so compare tree hashes with tree hashes.
+    """
+    if chunk_size <= 0 or chunk_size % mmap.ALLOCATIONGRANULARITY:
+        raise ValueError("chunk_size must be a positive multiple of {}".format(
+            mmap.ALLOCATIONGRANULARITY))
+    new_hash(algorithm)
+    size = os.path.getsize(path)
+    offsets = list(range(0, size, chunk_size)) or [0]
+    lengths = [min(chunk_size, size - offset) for offset in offsets]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        leaves = executor.map(hash_leaf, [path] * len(offsets), [algorithm] * len(offsets),
+                              offsets, lengths)
+        root = new_hash(algorithm)
+        root.update(NODE_PREFIX)
+        for leaf in leaves:
+            root.update(leaf)
+    return root.hexdigest()
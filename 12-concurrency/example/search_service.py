@@ -0,0 +1,190 @@
+# search_service.py
+# multi-process grep over a set of files, built on the search(paths, query_q,
+# results_q) worker from concurrency.py
+# - files are sharded across worker processes, each worker loads its shard
+#   once and keeps a trigram index per file, so a query only checks lines
+#   that contain every trigram of the query instead of every line
+# - matches stream back per file as soon as a worker finds them
+# - before each query a worker stats its files and re-indexes only the ones
+#   whose mtime or size changed
+# - a router thread hands every result to the queue of the search it belongs
+#   to, so searches do not block each other and an abandoned one is harmless
+import itertools
+import multiprocessing
+import os
+import queue
+import threading
+
+from collections import defaultdict
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class FileIndex(object):
+    """Lines of one file plus trigram -> line numbers postings."""
+
+    def __init__(self, path):
+        self.path = path
+        self.signature = None
+        self.lines = []
+        self.postings = {}
+
+    def stat_signature(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def clear(self):
+        self.signature = None
+        self.lines, self.postings = [], {}
+
+    def refresh(self):
+        """Re-index the file if it changed since the last build.
+        Returns False while the file is gone or cannot be read, e.g. it was
+        replaced by a directory or lost its read permission."""
+        signature = self.stat_signature()
+        if signature is None:
+            self.clear()
+            return False
+        if signature != self.signature:
+            try:
+                self.build()
+            except OSError:
+                # try again on the next query, the file may come back
+                self.clear()
+                return False
+            self.signature = signature
+        return True
+
+    def build(self):
+        with open(self.path, errors='replace') as f:
+            self.lines = [l.rstrip('\n') for l in f]
+        postings = defaultdict(list)
+        for line_no, line in enumerate(self.lines):
+            for gram in trigrams(line):
+                postings[gram].append(line_no)
+        self.postings = dict(postings)
+
+    def search(self, query):
+        if len(query) < 3:
+            # too short for the index, fall back to a scan
+            candidates = range(len(self.lines))
+        else:
+            grams = sorted(trigrams(query), key=lambda g: len(self.postings.get(g, ())))
+            candidates = set(self.postings.get(grams[0], ()))
+            for gram in grams[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(self.postings.get(gram, ()))
+            candidates = sorted(candidates)
+        # trigrams only narrow the candidates, confirm the actual substring
+        return [(line_no, self.lines[line_no]) for line_no in candidates
+                if query in self.lines[line_no]]
+
+
+def search(paths, query_q, results_q):
+    """Worker loop: index paths once, then answer (query_id, query) messages
+    until a None query arrives. Puts (query_id, path, matches) for every file
+    with matches, then (query_id, None, None) when the shard is done."""
+    indexes = [FileIndex(path) for path in paths]
+    for index in indexes:
+        index.refresh()
+    message = query_q.get()
+    while message is not None:
+        query_id, query = message
+        try:
+            for index in indexes:
+                if not index.refresh():
+                    continue
+                matches = index.search(query)
+                if matches:
+                    results_q.put((query_id, index.path, matches))
+        finally:
+            # SearchService.search waits for this marker from every shard
+            results_q.put((query_id, None, None))
+        message = query_q.get()
+
+
+def walk_files(root):
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            yield os.path.join(dirpath, filename)
+
+
+class SearchService(object):
+    def __init__(self, paths, num_workers=None):
+        paths = list(paths)
+        cpus = num_workers or multiprocessing.cpu_count()
+        # round robin shards, one per worker, as in concurrency.py
+        shards = [paths[i::cpus] for i in range(cpus)]
+        shards = [shard for shard in shards if shard] or [[]]
+        self.query_queues = [multiprocessing.Queue() for _ in shards]
+        self.results_queue = multiprocessing.Queue()
+        self.workers = []
+        for shard, query_q in zip(shards, self.query_queues):
+            p = multiprocessing.Process(target=search, args=(shard, query_q, self.results_queue),
+                                        daemon=True)
+            p.start()
+            self.workers.append(p)
+        self._query_ids = itertools.count()
+        # query_id -> queue.Queue of the search waiting for its results
+        self._results = {}
+        self._lock = threading.Lock()
+        self._router = threading.Thread(target=self._route_results, daemon=True)
+        self._router.start()
+
+    @classmethod
+    def from_directory(cls, root, num_workers=None):
+        return cls(walk_files(root), num_workers=num_workers)
+
+    def _route_results(self):
+        while True:
+            message = self.results_queue.get()
+            if message is None:
+                return
+            with self._lock:
+                results = self._results.get(message[0])
+            # nobody waits for the results of a search that was abandoned
+            if results is not None:
+                results.put(message)
+
+    def search(self, query):
+        """Yield (path, line_no, line) for every line containing query,
+        streamed as the workers find them."""
+        results = queue.Queue()
+        with self._lock:
+            query_id = next(self._query_ids)
+            self._results[query_id] = results
+        try:
+            for query_q in self.query_queues:
+                query_q.put((query_id, query))
+            pending = len(self.query_queues)
+            while pending:
+                _, path, matches = results.get()
+                if path is None:
+                    pending -= 1
+                    continue
+                for line_no, line in matches:
+                    yield path, line_no, line
+        finally:
+            with self._lock:
+                del self._results[query_id]
+
+    def close(self):
+        for query_q in self.query_queues:
+            query_q.put(None)
+        for p in self.workers:
+            p.join()
+        # the workers are gone, so this is the last message on the queue
+        self.results_queue.put(None)
+        self._router.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,91 @@
+# stage_metrics.py
+# per-stage counters for the producer / consumer thumbnail pipelines
+# - queue depth seen at every put / get (max and average)
+# - time spent blocked on the queue (a full queue stalls the producer,
+#   an empty one idles the consumer)
+# - items handled and items per second over the stage's lifetime
+import threading
+import time
+
+
+class StageMetrics(object):
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self.items = 0
+        self.wait_time = 0.0
+        self.max_depth = 0
+        self.depth_total = 0
+        self.depth_samples = 0
+        self.started = None
+        self.finished = None
+
+    def record_wait(self, seconds, depth):
+        """Record time blocked on the queue and the depth it had afterwards."""
+        with self._lock:
+            self.wait_time += seconds
+            self.max_depth = max(self.max_depth, depth)
+            self.depth_total += depth
+            self.depth_samples += 1
+
+    def record_item(self):
+        now = time.perf_counter()
+        with self._lock:
+            if self.started is None:
+                self.started = now
+            self.finished = now
+            self.items += 1
+
+    @property
+    def avg_depth(self):
+        return self.depth_total / self.depth_samples if self.depth_samples else 0.0
+
+    @property
+    def items_per_second(self):
+        if not self.items or self.finished == self.started:
+            return 0.0
+        return self.items / (self.finished - self.started)
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'items': self.items,
+            'wait_time': self.wait_time,
+            'max_depth': self.max_depth,
+            'depth_total': self.depth_total,
+            'depth_samples': self.depth_samples,
+            'started': self.started,
+            'finished': self.finished,
+        }
+
+    def __getstate__(self):
+        # the lock cannot be pickled, e.g. when a service holding metrics is
+        # sent to a spawned worker process
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def merge(self, other):
+        """Fold in the counters of another StageMetrics or its as_dict(),
+        e.g. one sent back from a worker process."""
+        if isinstance(other, StageMetrics):
+            other = other.as_dict()
+        with self._lock:
+            self.items += other['items']
+            self.wait_time += other['wait_time']
+            self.max_depth = max(self.max_depth, other['max_depth'])
+            self.depth_total += other['depth_total']
+            self.depth_samples += other['depth_samples']
+            if other['started'] is not None:
+                self.started = min(filter(None, (self.started, other['started'])))
+                self.finished = max(filter(None, (self.finished, other['finished'])))
+
+    def __str__(self):
+        return "{} stage: {} items, {:.2f} items/s, waited {:.3f} s, " \
+            "queue depth max {} avg {:.1f}".format(
+                self.name, self.items, self.items_per_second,
+                self.wait_time, self.max_depth, self.avg_depth)
@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from async_downloader import AsyncDownloader
+
+IMAGE_BYTES = b'\xff\xd8' + bytes(range(256)) * 1024
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    # a local stand-in for the image host
+    # /flaky fails with 503 on every other request, /missing is a 404
+    protocol_version = 'HTTP/1.1'
+    flaky_calls = 0
+
+    def do_GET(self):
+        if self.path == '/missing':
+            return self.reply(404, b'')
+        if self.path == '/flaky':
+            StandInHandler.flaky_calls += 1
+            if StandInHandler.flaky_calls % 2:
+                return self.reply(503, b'')
+        if self.headers.get('If-None-Match') == '"v1"':
+            return self.reply(304, b'')
+        self.reply(200, IMAGE_BYTES)
+
+    def reply(self, status, body):
+        self.send_response(status)
+        self.send_header('ETag', '"v1"')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def base_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_port)
+    server.shutdown()
+
+
+def run(coro_fn, **options):
+    options.setdefault('backoff', 0.01)
+
+    async def main():
+        async with AsyncDownloader(**options) as downloader:
+            return await coro_fn(downloader)
+    return asyncio.run(main())
+
+
+def test_download_streams_to_disk(base_url, tmp_path):
+    urls = ['{}/img{}.jpeg'.format(base_url, i) for i in range(20)]
+    dests = [str(tmp_path / 'img{}.jpeg'.format(i)) for i in range(20)]
+
+    async def download_all(downloader):
+        return await asyncio.gather(*[downloader.download(url, dest)
+                                      for url, dest in zip(urls, dests)])
+
+    sizes = run(download_all, max_concurrency=4, limit_per_host=2, chunk_size=4096)
+    assert sizes == [len(IMAGE_BYTES)] * 20
+    assert (tmp_path / 'img7.jpeg').read_bytes() == IMAGE_BYTES
+
+
+def test_fetch_supports_conditional_requests(base_url):
+    data, headers = run(lambda d: d.fetch(base_url + '/img.jpeg'))
+    assert data == IMAGE_BYTES
+    assert headers['ETag'] == '"v1"'
+    data, _ = run(lambda d: d.fetch(base_url + '/img.jpeg', headers={'If-None-Match': '"v1"'}))
+    assert data is None
+
+
+def test_retries_transient_errors(base_url):
+    data, _ = run(lambda d: d.fetch(base_url + '/flaky'), retries=2)
+    assert data == IMAGE_BYTES
+
+
+def test_client_errors_are_not_retried(base_url):
+    with pytest.raises(aiohttp.ClientResponseError):
+        run(lambda d: d.fetch(base_url + '/missing'), retries=5, backoff=10)
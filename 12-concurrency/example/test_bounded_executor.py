@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from bounded_executor import bounded_map
+
+
+def multiply_by_two(item):
+    return item * 2
+
+
+def test_ordered_results_keep_duplicates():
+    data = [3, 1, 3, 2, 1] * 20
+    assert list(bounded_map(multiply_by_two, data)) == [item * 2 for item in data]
+
+
+def test_unordered_results_yield_as_completed():
+    def slow_first(item):
+        time.sleep(0.2 if item == 0 else 0)
+        return item
+    results = list(bounded_map(slow_first, range(10), max_workers=4, ordered=False))
+    assert sorted(results) == list(range(10))
+    assert results[-1] == 0
+
+
+def test_input_is_consumed_lazily():
+    pulled = []
+
+    def items():
+        for i in range(1000000):
+            pulled.append(i)
+            yield i
+
+    results = bounded_map(multiply_by_two, items(), max_workers=2, max_in_flight=3)
+    assert [next(results) for _ in range(5)] == [0, 2, 4, 6, 8]
+    # only the window ahead of the consumer has been pulled from the input
+    assert len(pulled) <= 5 + 3
+    results.close()
+
+
+def test_process_pool_with_chunks():
+    results = bounded_map(abs, range(-500, 500), executor='process', max_workers=2, chunksize=64)
+    assert list(results) == [abs(i) for i in range(-500, 500)]
+
+
+def test_errors_propagate():
+    def fail_on_three(item):
+        if item == 3:
+            raise ValueError(item)
+        return item
+    with pytest.raises(ValueError):
+        list(bounded_map(fail_on_three, range(10)))
@@ -0,0 +1,75 @@
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from crawler import LatencyHistogram, download_all_sites
+
+BODY = b'<html>' + b'x' * 200000 + b'</html>'
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        body = b'' if self.path == '/missing' else BODY
+        self.send_response(404 if self.path == '/missing' else 200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def base_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_port)
+    server.shutdown()
+
+
+def test_crawl_streams_bodies_and_records_latency(base_url):
+    sites = ['{}/page/{}'.format(base_url, i) for i in range(200)] + [base_url + '/missing']
+    received = {}
+
+    def sink(url, chunk):
+        received[url] = received.get(url, 0) + len(chunk)
+
+    results, crawler = download_all_sites(sites, sink=sink, max_connections=20,
+                                          limit_per_host=10, chunk_size=16 * 1024)
+    assert sorted(r.url for r in results) == sorted(sites)
+    by_url = {r.url: r for r in results}
+    assert by_url[base_url + '/missing'].status == 404
+    assert all(by_url[url].size == len(BODY) == received[url] for url in sites[:-1])
+    assert crawler.latency.count == len(sites)
+    assert crawler.host_latency[base_url.split('//')[1]].count == len(sites)
+
+
+def test_failures_are_returned():
+    results, _ = download_all_sites(['http://127.0.0.1:1/'], timeout=2)
+    assert results[0].status is None and results[0].error is not None
+
+
+def test_rate_limit(base_url):
+    sites = [base_url] * 12
+    start = time.perf_counter()
+    download_all_sites(sites, rate=20, burst=2)
+    # 2 requests from the burst, the other 10 at 20 per second
+    assert time.perf_counter() - start >= 0.45
+
+
+def test_histogram_percentiles():
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000)
+    assert histogram.count == 100
+    assert histogram.percentile(50) == pytest.approx(0.064)
+    assert histogram.percentile(100) == pytest.approx(0.1)
+    assert histogram.mean == pytest.approx(0.0505)
@@ -0,0 +1,52 @@
+import hashlib
+import mmap
+
+import pytest
+
+from hash_service import LEAF_PREFIX, NODE_PREFIX, hash_blobs, hash_files, tree_hash
+
+CHUNK = mmap.ALLOCATIONGRANULARITY
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+    for i, size in enumerate([0, 1, CHUNK, 3 * CHUNK + 17]):
+        path = tmp_path / 'file{}.bin'.format(i)
+        path.write_bytes(bytes(range(256)) * (size // 256) + b'x' * (size % 256))
+        paths.append(str(path))
+    return paths
+
+
+@pytest.mark.parametrize('algorithm', ['sha256', 'md5', 'blake2b'])
+def test_hash_files_matches_hashlib(files, algorithm):
+    digests = hash_files(files, algorithm, max_workers=2)
+    for path in files:
+        with open(path, 'rb') as f:
+            assert digests[path] == hashlib.new(algorithm, f.read()).hexdigest()
+
+
+def test_hash_blobs_in_order():
+    blobs = [b'', b'a', b'abc' * 1000, bytearray(b'xyz')]
+    assert hash_blobs(blobs, 'sha384', max_workers=2) == \
+        [hashlib.sha384(bytes(blob)).hexdigest() for blob in blobs]
+
+
+def test_tree_hash_combines_chunk_digests(files):
+    path = files[-1]
+    with open(path, 'rb') as f:
+        data = f.read()
+    leaves = [hashlib.sha256(LEAF_PREFIX + data[i:i + CHUNK]).digest()
+              for i in range(0, len(data), CHUNK)]
+    expected = hashlib.sha256(NODE_PREFIX + b''.join(leaves)).hexdigest()
+    assert tree_hash(path, chunk_size=CHUNK, max_workers=2) == expected
+    # an empty file is a single empty chunk
+    empty_leaf = hashlib.sha256(LEAF_PREFIX).digest()
+    assert tree_hash(files[0], chunk_size=CHUNK) == hashlib.sha256(NODE_PREFIX + empty_leaf).hexdigest()
+
+
+def test_rejects_unknown_algorithm_and_bad_chunks(files):
+    with pytest.raises(ValueError):
+        hash_files(files, 'not-a-hash')
+    with pytest.raises(ValueError):
+        tree_hash(files[-1], chunk_size=CHUNK + 1)
@@ -0,0 +1,79 @@
+import os
+import threading
+import time
+
+import pytest
+
+from search_service import FileIndex, SearchService
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    for i in range(6):
+        lines = ['request {} served in {} ms'.format(n, n % 7) for n in range(50)]
+        lines.append('ERROR disk full on host-{}'.format(i))
+        (tmp_path / 'app-{}.log'.format(i)).write_text('\n'.join(lines) + '\n')
+    return tmp_path
+
+
+def test_file_index_matches_substring_scan(log_dir):
+    index = FileIndex(str(log_dir / 'app-0.log'))
+    index.refresh()
+    for query in ['served in 3', 'ERROR', 'st 4', 'in', 'no such text']:
+        expected = [(n, l) for n, l in enumerate(index.lines) if query in l]
+        assert index.search(query) == expected
+
+
+def test_service_streams_matches_from_all_shards(log_dir):
+    with SearchService.from_directory(str(log_dir), num_workers=3) as service:
+        matches = list(service.search('ERROR disk full'))
+        assert sorted(os.path.basename(path) for path, _, _ in matches) == \
+            ['app-{}.log'.format(i) for i in range(6)]
+        assert all(line_no == 50 for _, line_no, _ in matches)
+        # the same index answers many queries
+        assert len(list(service.search('request 49 '))) == 6
+        assert list(service.search('missing')) == []
+
+
+def test_changed_files_are_reindexed(log_dir):
+    with SearchService.from_directory(str(log_dir), num_workers=2) as service:
+        assert list(service.search('rotated')) == []
+        path = log_dir / 'app-2.log'
+        path.write_text('log rotated\n')
+        # make sure the mtime moves even on coarse filesystem clocks
+        os.utime(str(path), ns=(time.time_ns() + 10 ** 9,) * 2)
+        assert list(service.search('rotated')) == [(str(path), 0, 'log rotated')]
+        # app-2 no longer has the error line and app-3 is gone
+        (log_dir / 'app-3.log').unlink()
+        assert len(list(service.search('ERROR'))) == 4
+
+
+def test_unreadable_files_are_skipped(log_dir):
+    with SearchService.from_directory(str(log_dir), num_workers=2) as service:
+        assert len(list(service.search('ERROR'))) == 6
+        path = log_dir / 'app-1.log'
+        path.unlink()
+        # same name, but it can no longer be read as a file
+        path.mkdir()
+        assert len(list(service.search('ERROR'))) == 5
+        path.rmdir()
+        path.write_text('ERROR back again\n')
+        assert len(list(service.search('ERROR'))) == 6
+
+
+def test_abandoned_search_does_not_block_the_service(log_dir):
+    def run():
+        service = SearchService.from_directory(str(log_dir), num_workers=2)
+        partial = service.search('ERROR')
+        assert next(partial)[2].startswith('ERROR')
+        # the first search is neither finished nor closed
+        outcome['second'] = len(list(service.search('request 49 ')))
+        service.close()
+        outcome['closed'] = True
+
+    outcome = {}
+    runner = threading.Thread(target=run, daemon=True)
+    runner.start()
+    runner.join(30)
+    assert not runner.is_alive(), 'the abandoned search blocked the service'
+    assert outcome == {'second': 6, 'closed': True}
@@ -0,0 +1,53 @@
+import os
+
+import pytest
+
+from thumbnail_cache import ThumbnailCache, hash_bytes
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ThumbnailCache(str(tmp_path / 'cache'), max_bytes=100)
+
+
+def write_thumbnails(cache, digest, widths, size=30):
+    os.makedirs(cache.blob_dir(digest), exist_ok=True)
+    for width in widths:
+        with open(cache.thumbnail_path(digest, width, '.jpeg'), 'wb') as f:
+            f.write(b'x' * size)
+    cache.add_thumbnails(digest, '.jpeg', widths)
+
+
+def test_identical_bytes_share_one_entry(cache):
+    digest = hash_bytes(b'same image')
+    write_thumbnails(cache, digest, [32, 64])
+    cache.record_url('http://a.example/photo.jpeg', digest, etag='"abc"')
+    cache.record_url('http://b.example/photo.jpeg', hash_bytes(b'same image'))
+    assert cache.digest_for_url('http://b.example/photo.jpeg') == digest
+    assert cache.has_sizes(digest, [32, 64])
+    assert not cache.has_sizes(digest, [32, 200])
+    assert cache.validators('http://a.example/photo.jpeg') == ('"abc"', None)
+
+
+def test_index_persists_across_instances(cache):
+    digest = hash_bytes(b'image')
+    write_thumbnails(cache, digest, [32])
+    cache.record_url('http://a.example/photo.jpeg', digest, last_modified='yesterday')
+    cache.save()
+    reloaded = ThumbnailCache(cache.cache_dir)
+    assert reloaded.has_sizes(digest, [32])
+    assert reloaded.validators('http://a.example/photo.jpeg') == (None, 'yesterday')
+
+
+def test_evicts_least_recently_used(cache, tmp_path):
+    old, new = hash_bytes(b'old'), hash_bytes(b'new')
+    write_thumbnails(cache, old, [32, 64])
+    write_thumbnails(cache, new, [32, 64])
+    cache.record_url('http://a.example/old.jpeg', old)
+    # reading the old image makes the new one the eviction candidate
+    cache.materialize(old, [32], 'old.jpeg', str(tmp_path))
+    assert cache.evict() == [new]
+    assert cache.has_sizes(old, [32, 64])
+    assert not os.path.exists(cache.thumbnail_path(new, 32, '.jpeg'))
+    assert cache.total_bytes <= cache.max_bytes
+    assert os.path.exists(str(tmp_path / 'old_32.jpeg'))
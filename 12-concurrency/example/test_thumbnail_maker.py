@@ -1,3 +1,17 @@
+import asyncio
+import functools
+import io
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import shared_memory
+
+import pytest
+from PIL import Image
+
+import thumbnail_maker
 from thumbnail_maker import ThumbnailMakerService
 
 IMG_URLS = \
@@ -32,3 +46,242 @@ IMG_URLS = \
 def test_thumbnail_maker():
     tn_maker = ThumbnailMakerService()
     tn_maker.make_thumbnails(IMG_URLS)
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def local_urls(tmp_path_factory):
+    # serve a few generated JPEGs from a local stand-in for the image host
+    img_dir = tmp_path_factory.mktemp('served')
+    for i in range(4):
+        Image.new('RGB', (640, 480), (i * 60, 100, 200)).save(str(img_dir / 'img{}.jpeg'.format(i)))
+    handler = functools.partial(QuietHandler, directory=str(img_dir))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield ['http://127.0.0.1:{}/img{}.jpeg'.format(server.server_port, i) for i in range(4)]
+    server.shutdown()
+
+
+@pytest.mark.parametrize('kind, executor_type', [
+    ('thread', ThreadPoolExecutor),
+    ('process', ProcessPoolExecutor),
+])
+def test_create_executor(kind, executor_type):
+    executor = thumbnail_maker.create_executor(kind, 2)
+    try:
+        assert isinstance(executor, executor_type)
+    finally:
+        executor.shutdown()
+    # the 'asyncio' stage runs on the event loop's default executor
+    assert thumbnail_maker.create_executor('asyncio') is None
+
+
+def test_engine_rejects_unknown_executors():
+    with pytest.raises(ValueError, match='executor must be one of'):
+        ThumbnailMakerService(resize_executor='greenlet')
+    with pytest.raises(ValueError, match='executor must be one of'):
+        thumbnail_maker.create_executor('greenlet')
+
+
+def jpeg_bytes(width, height):
+    buf = io.BytesIO()
+    Image.new('RGB', (width, height), (30, 120, 200)).save(buf, format='JPEG')
+    return buf.getvalue()
+
+
+def test_resize_cascade_drafts_and_chains_each_target(monkeypatch):
+    calls = []
+    resize = Image.Image.resize
+
+    def spy(img, size, resample=None, *args, **kwargs):
+        calls.append((img.size, size, resample))
+        return resize(img, size, resample, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, 'resize', spy)
+    orig_img = Image.open(io.BytesIO(jpeg_bytes(1600, 1200)))
+    targets = [32, (200, Image.BICUBIC), 64]
+    sizes = [(width, img.size) for width, img in thumbnail_maker.resize_cascade(orig_img, targets)]
+    assert sizes == [(200, (200, 150)), (64, (64, 48)), (32, (32, 24))]
+    # draft() let the decoder scale by 1/8, which still covers the largest target
+    assert calls[0][0] == (200, 150)
+    # every smaller thumbnail comes from the previous one, with its own filter
+    assert [call[0] for call in calls[1:]] == [(200, 150), (64, 48)]
+    assert [call[2] for call in calls] == \
+        [Image.BICUBIC, thumbnail_maker.DEFAULT_RESAMPLE, thumbnail_maker.DEFAULT_RESAMPLE]
+
+
+def test_resize_cascade_keeps_non_jpeg_at_full_size():
+    buf = io.BytesIO()
+    Image.new('RGB', (640, 480)).save(buf, format='PNG')
+    orig_img = Image.open(buf)
+    assert [img.size for _, img in thumbnail_maker.resize_cascade(orig_img, [64])] == [(64, 48)]
+    assert orig_img.size == (640, 480)
+
+
+def test_resize_image_shared_reads_from_shared_memory(tmp_path):
+    data = jpeg_bytes(640, 480)
+    shm = shared_memory.SharedMemory(create=True, size=len(data) + 100)
+    try:
+        # the block may be larger than the image, only size bytes are read
+        shm.buf[:len(data)] = data
+        thumbnail_maker.resize_image_shared('img.jpeg', shm.name, len(data),
+                                            str(tmp_path), [64, 32])
+    finally:
+        shm.close()
+        shm.unlink()
+    assert sorted(os.listdir(str(tmp_path))) == ['img_32.jpeg', 'img_64.jpeg']
+    assert Image.open(str(tmp_path / 'img_64.jpeg')).size == (64, 48)
+
+
+def test_in_memory_mode_skips_the_incoming_dir(local_urls, tmp_path):
+    tn_maker = ThumbnailMakerService(home_dir=str(tmp_path), resize_executor='process',
+                                     in_memory=True)
+    assert len(tn_maker.make_thumbnails(local_urls)) == len(local_urls)
+    assert os.listdir(str(tmp_path)) == ['outgoing']
+
+
+@pytest.mark.parametrize('options', [
+    dict(dl_executor='thread', resize_executor='process'),
+    dict(dl_executor='asyncio', resize_executor='thread'),
+    dict(dl_executor='thread', resize_executor='process', in_memory=True),
+    dict(dl_executor='asyncio', resize_executor='asyncio', in_memory=True),
+])
+def test_engine_executors(local_urls, tmp_path, options):
+    tn_maker = ThumbnailMakerService(home_dir=str(tmp_path), **options)
+    assert len(tn_maker.make_thumbnails(local_urls)) == len(local_urls)
+    outputs = os.listdir(str(tmp_path / 'outgoing'))
+    assert len(outputs) == 3 * len(local_urls)
+    thumb = [name for name in outputs if name.endswith('_64.jpeg')][0]
+    assert Image.open(str(tmp_path / 'outgoing' / thumb)).size == (64, 48)
+
+
+@pytest.mark.parametrize('dl_executor', ['thread', 'asyncio'])
+def test_engine_isolates_failed_urls(local_urls, tmp_path, dl_executor):
+    missing = local_urls[0].replace('img0', 'missing')
+    tn_maker = ThumbnailMakerService(home_dir=str(tmp_path), dl_executor=dl_executor,
+                                     resize_executor='thread', in_memory=True)
+    resized = tn_maker.make_thumbnails([missing] + local_urls)
+    assert len(resized) == len(local_urls)
+    assert list(tn_maker.failed_urls) == [missing]
+    assert len(os.listdir(str(tmp_path / 'outgoing'))) == 3 * len(local_urls)
+
+
+class CountingService(ThumbnailMakerService):
+    """Counts the images fetched into memory and not yet resized."""
+
+    held = peak = 0
+
+    async def fetch(self, url, etag=None, last_modified=None):
+        result = await super().fetch(url, etag, last_modified)
+        self.held += 1
+        self.peak = max(self.peak, self.held)
+        return result
+
+    async def resize_bytes(self, img_filename, data, output_dir):
+        try:
+            await asyncio.sleep(0.02)
+            return await super().resize_bytes(img_filename, data, output_dir)
+        finally:
+            self.held -= 1
+
+
+def test_engine_bounds_images_held_in_memory(local_urls, tmp_path):
+    # downloads outpace the single slow resize worker
+    tn_maker = CountingService(home_dir=str(tmp_path), dl_executor='thread',
+                               resize_executor='thread', num_dl_workers=8,
+                               num_resize_workers=1, in_memory=True)
+    urls = ['{}?copy={}'.format(url, i) for i in range(4) for url in local_urls]
+    assert len(tn_maker.make_thumbnails(urls)) == len(urls)
+    assert tn_maker.peak == 2
+
+
+def test_engine_reuses_cached_thumbnails(local_urls, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    tn_maker = ThumbnailMakerService(home_dir=str(tmp_path / 'first'), cache_dir=cache_dir,
+                                     target_sizes=[32, (100, Image.BICUBIC)])
+    tn_maker.make_thumbnails(local_urls)
+    rerun = ThumbnailMakerService(home_dir=str(tmp_path / 'second'), cache_dir=cache_dir,
+                                  target_sizes=[32, 100])
+    rerun.make_thumbnails(local_urls)
+    assert len(os.listdir(str(tmp_path / 'second' / 'outgoing'))) == 2 * len(local_urls)
+    assert len(rerun.cache.blobs) == len(local_urls)
+
+
+class RecordingService(ThumbnailMakerService):
+    """Keeps what every fetch returned and every image it resized."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fetched = []
+        self.resized = []
+
+    async def fetch(self, url, etag=None, last_modified=None):
+        result = await super().fetch(url, etag, last_modified)
+        self.fetched.append(result[1])
+        return result
+
+    async def resize_bytes(self, img_filename, data, output_dir):
+        self.resized.append(img_filename)
+        return await super().resize_bytes(img_filename, data, output_dir)
+
+
+def test_engine_resizes_identical_images_once(local_urls, tmp_path):
+    cache_dir = str(tmp_path / 'cache')
+    # two urls for the same bytes
+    urls = [local_urls[0] + '?copy=1', local_urls[0] + '?copy=2']
+    tn_maker = RecordingService(home_dir=str(tmp_path / 'first'), cache_dir=cache_dir,
+                                resize_executor='thread')
+    assert len(tn_maker.make_thumbnails(urls)) == 2
+    assert len(tn_maker.resized) == 1
+    assert len(os.listdir(str(tmp_path / 'first' / 'outgoing'))) == 2 * 3
+
+    # unchanged images are revalidated with a 304 and not downloaded again
+    rerun = RecordingService(home_dir=str(tmp_path / 'second'), cache_dir=cache_dir,
+                             resize_executor='thread')
+    rerun.make_thumbnails(urls)
+    assert rerun.fetched == [None, None]
+    assert rerun.resized == []
+    assert len(os.listdir(str(tmp_path / 'second' / 'outgoing'))) == 2 * 3
+
+
+@pytest.mark.parametrize('module_name, consumers', [
+    ('thumbnail_maker_queue', dict(num_resize_threads=3)),
+    ('thumbnail_maker_multiprocessing_queue', dict(num_processes=3)),
+])
+def test_bounded_queue_shuts_down_every_consumer(local_urls, tmp_path, module_name, consumers):
+    import importlib
+    module = importlib.import_module(module_name)
+    tn_maker = module.ThumbnailMakerService(home_dir=str(tmp_path), num_dl_threads=4,
+                                            queue_size=1, **consumers)
+    # a failed download must not leave a consumer waiting for its image
+    urls = local_urls + [local_urls[0].replace('img0', 'missing')]
+    runner = threading.Thread(target=tn_maker.make_thumbnails, args=(urls,), daemon=True)
+    runner.start()
+    runner.join(60)
+    assert not runner.is_alive(), 'a consumer never got its poison pill'
+    assert len(os.listdir(str(tmp_path / 'outgoing'))) == 3 * len(local_urls)
+    assert tn_maker.dl_metrics.items == len(local_urls)
+    assert tn_maker.resize_metrics.items == len(local_urls)
+    # every consumer took exactly one pill off the queue
+    assert tn_maker.resize_metrics.depth_samples == len(local_urls) + 3
+
+
+def test_benchmark_smoke():
+    import benchmark
+    results = benchmark.benchmark(['basic', 'engine_in_memory'], count=2, width=64, height=48, seed=1)
+    assert [r['variant'] for r in results] == ['basic', 'engine_in_memory']
+    assert all(r['thumbnails'] == 6 and r['complete'] for r in results)
+    assert 'img/s' in benchmark.format_table(results)
+
+
+def test_benchmark_flags_incomplete_variants():
+    import benchmark
+    # thumbnail_maker_thread downloads but its resize step is commented out
+    results = benchmark.benchmark(['thread'], count=2, width=64, height=48, seed=1)
+    assert results[0]['thumbnails'] == 0 and not results[0]['complete']
+    assert results[0]['images_per_second'] is None
+    assert 'incomplete: expected 6 thumbnails' in benchmark.format_table(results)
@@ -0,0 +1,148 @@
+# thumbnail_cache.py
+# persistent, content addressed cache for ThumbnailMakerService
+# - urls map to the validators (ETag / Last-Modified) of their last download
+#   and to the sha256 digest of the bytes that came back
+# - digests map to the thumbnails generated for those bytes, so the same image
+#   served from two urls is only resized once
+# - thumbnails are evicted least recently used first once the cache grows
+#   over its disk budget
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ThumbnailCache(object):
+    INDEX_FILENAME = 'index.json'
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, self.INDEX_FILENAME)
+        self._lock = threading.Lock()
+        # url -> {'etag', 'last_modified', 'digest'}
+        self.urls = {}
+        # digest -> {'ext', 'sizes': {width: bytes}, 'last_access'}, least recently used first
+        self.blobs = OrderedDict()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            logging.warning("ignoring unreadable thumbnail cache index {}".format(self.index_path))
+            return
+        self.urls = index.get('urls', {})
+        blobs = sorted(index.get('blobs', {}).items(), key=lambda item: item[1]['last_access'])
+        self.blobs = OrderedDict(blobs)
+
+    def save(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with self._lock:
+            index = {'urls': self.urls, 'blobs': self.blobs}
+            # write to a temp file and swap it in so a crash never leaves a torn index
+            tmp_path = self.index_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(index, f)
+            os.replace(tmp_path, self.index_path)
+
+    @property
+    def total_bytes(self):
+        return sum(sum(blob['sizes'].values()) for blob in self.blobs.values())
+
+    def validators(self, url):
+        """Return (etag, last_modified) to make a conditional request for url."""
+        entry = self.urls.get(url, {})
+        return entry.get('etag'), entry.get('last_modified')
+
+    def digest_for_url(self, url):
+        return self.urls.get(url, {}).get('digest')
+
+    def record_url(self, url, digest, etag=None, last_modified=None):
+        with self._lock:
+            self.urls[url] = {'etag': etag, 'last_modified': last_modified, 'digest': digest}
+
+    def blob_dir(self, digest):
+        return os.path.join(self.cache_dir, digest[:2])
+
+    def thumbnail_path(self, digest, width, ext):
+        return os.path.join(self.blob_dir(digest), '{}_{}{}'.format(digest, width, ext))
+
+    def has_sizes(self, digest, widths):
+        blob = self.blobs.get(digest)
+        if blob is None:
+            return False
+        for width in widths:
+            if str(width) not in blob['sizes']:
+                return False
+            if not os.path.exists(self.thumbnail_path(digest, width, blob['ext'])):
+                return False
+        return True
+
+    def add_thumbnails(self, digest, ext, widths):
+        """Index thumbnails that were written to thumbnail_path(digest, width, ext)."""
+        with self._lock:
+            blob = self.blobs.setdefault(digest, {'ext': ext, 'sizes': {}, 'last_access': 0})
+            for width in widths:
+                path = self.thumbnail_path(digest, width, ext)
+                blob['sizes'][str(width)] = os.path.getsize(path)
+            self._touch(digest)
+
+    def materialize(self, digest, widths, filename, output_dir):
+        """Place cached thumbnails for digest in output_dir as <name>_<width><ext>."""
+        with self._lock:
+            blob = self.blobs[digest]
+            self._touch(digest)
+        outputs = []
+        for width in widths:
+            src = self.thumbnail_path(digest, width, blob['ext'])
+            dest = os.path.join(output_dir, os.path.splitext(filename)[0] +
+                                '_' + str(width) + os.path.splitext(filename)[1])
+            if os.path.exists(dest):
+                os.remove(dest)
+            try:
+                # hard links are free when the cache and output dir share a volume
+                os.link(src, dest)
+            except OSError:
+                shutil.copyfile(src, dest)
+            outputs.append(dest)
+        return outputs
+
+    def _touch(self, digest):
+        self.blobs[digest]['last_access'] = time.time()
+        self.blobs.move_to_end(digest)
+
+    def evict(self):
+        """Drop least recently used thumbnails until the cache fits max_bytes."""
+        evicted = []
+        with self._lock:
+            total = self.total_bytes
+            while total > self.max_bytes and self.blobs:
+                digest, blob = self.blobs.popitem(last=False)
+                for width, size in blob['sizes'].items():
+                    path = self.thumbnail_path(digest, width, blob['ext'])
+                    if os.path.exists(path):
+                        os.remove(path)
+                    total -= size
+                evicted.append(digest)
+            if evicted:
+                evicted_digests = set(evicted)
+                self.urls = {url: entry for url, entry in self.urls.items()
+                             if entry['digest'] not in evicted_digests}
+        if evicted:
+            logging.info("evicted {} images from the thumbnail cache".format(len(evicted)))
+        return evicted
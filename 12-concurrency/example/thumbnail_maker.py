@@ -0,0 +1,450 @@
+# thumbnail_maker.py
+# unified engine for the thumbnail_maker_* variants in this folder
+# both the download stage and the resize stage run on a chosen executor
+# ('thread', 'process' or 'asyncio') and every image is resized as soon as
+# its download lands instead of waiting for the whole batch
+import asyncio
+import collections
+import hashlib
+import io
+import time
+import os
+import logging
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen, urlretrieve
+
+import PIL
+from PIL import Image
+
+from thumbnail_cache import ThumbnailCache, hash_bytes
+
+try:
+    from async_downloader import AsyncDownloader
+except ImportError:
+    # without aiohttp the 'asyncio' download stage runs urllib on the loop's executor
+    AsyncDownloader = None
+
+filename = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'logfile.log')
+
+FORMAT = "[%(processName)s, %(threadName)s, %(asctime)s, %(levelname)s] %(message)s"
+logging.basicConfig(filename=filename, level=logging.DEBUG, format=FORMAT)
+
+EXECUTOR_KINDS = ('thread', 'process', 'asyncio')
+DEFAULT_RESAMPLE = PIL.Image.LANCZOS
+REDUCING_GAP = 3.0
+
+
+def img_filename_for(url):
+    # the url path alone collides when two hosts serve the same file name,
+    # so tag the name with a short hash of the full url
+    name, ext = os.path.splitext(urlparse(url).path.split('/')[-1])
+    url_hash = hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]
+    return '{}-{}{}'.format(name, url_hash, ext)
+
+
+# the stage functions live at module level (not on the service) so a process
+# pool only has to pickle a few strings per task instead of the whole service
+def download_image(url, input_dir):
+    # download each image and save to the input dir
+    logging.info("download image at URL " + url)
+    img_filename = img_filename_for(url)
+    dest_path = input_dir + os.path.sep + img_filename
+    urlretrieve(url, dest_path)
+    logging.info("image saved to {}".format(dest_path))
+    return img_filename
+
+
+def normalize_target_sizes(target_sizes):
+    """Return target sizes as (width, resample) pairs, largest width first.
+    Each target is either a width or a (width, resample filter) pair, e.g.
+    [32, (64, PIL.Image.BICUBIC), 200].
+    """
+    targets = []
+    for target in target_sizes:
+        if isinstance(target, int):
+            target = (target, DEFAULT_RESAMPLE)
+        basewidth, resample = target
+        targets.append((int(basewidth), resample))
+    return sorted(targets, key=lambda target: target[0], reverse=True)
+
+
+def resize_cascade(orig_img, target_sizes):
+    """Decode the image once and yield (basewidth, img) for every target.
+    JPEGs are decoded straight at a reduced scale with draft() and every
+    smaller thumbnail is derived from the next larger one instead of from
+    the full resolution original.
+    """
+    targets = normalize_target_sizes(target_sizes)
+    if not targets:
+        return
+    # keep the aspect ratio of the original, draft() may round the decoded size
+    orig_width, orig_height = orig_img.size
+
+    def target_height(basewidth):
+        # calculate target height of the resized image to maintain the aspect ratio
+        wpercent = (basewidth / float(orig_width))
+        return max(int((float(orig_height) * float(wpercent))), 1)
+
+    largest = targets[0][0]
+    if orig_img.format == 'JPEG':
+        # let the decoder scale by 1/2, 1/4 or 1/8 while staying >= the largest target
+        orig_img.draft(orig_img.mode, (largest, target_height(largest)))
+
+    img = orig_img
+    for basewidth, resample in targets:
+        # reducing_gap uses the cheap reduce() pass first on big downscales
+        img = img.resize((basewidth, target_height(basewidth)), resample,
+                         reducing_gap=REDUCING_GAP)
+        yield basewidth, img
+
+
+def resize_image(filename, input_dir, output_dir, target_sizes):
+    logging.info("resizing image {}".format(filename))
+    orig_img = Image.open(input_dir + os.path.sep + filename)
+    for basewidth, img in resize_cascade(orig_img, target_sizes):
+        # save the resized image to the output dir with a modified file name
+        new_filename = os.path.splitext(filename)[0] + \
+            '_' + str(basewidth) + os.path.splitext(filename)[1]
+        img.save(output_dir + os.path.sep + new_filename)
+    orig_img.close()
+
+    os.remove(input_dir + os.path.sep + filename)
+    logging.info("done resizing image {}".format(filename))
+    return filename
+
+
+class MemoryViewReader(io.RawIOBase):
+    """Read-only file object over a memoryview so PIL can decode straight
+    from a shared memory block without copying it into a bytes object first.
+    """
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            self._pos = offset
+        elif whence == io.SEEK_CUR:
+            self._pos += offset
+        elif whence == io.SEEK_END:
+            self._pos = len(self._view) + offset
+        return self._pos
+
+    def readinto(self, b):
+        chunk = self._view[self._pos:self._pos + len(b)]
+        n = len(chunk)
+        b[:n] = chunk
+        chunk.release()
+        self._pos += n
+        return n
+
+    def close(self):
+        # drop the reference so the shared memory block can be closed
+        self._view = None
+        super().close()
+
+
+def fetch_image(url):
+    # download each image into memory, nothing is staged in the input dir
+    logging.info("fetch image at URL " + url)
+    img_filename = img_filename_for(url)
+    with urlopen(url) as resp:
+        data = resp.read()
+    logging.info("image [ {} bytes ] fetched from {}".format(len(data), url))
+    return img_filename, data
+
+
+def fetch_image_conditional(url, etag=None, last_modified=None):
+    """Fetch url unless it is unchanged since the cached validators.
+    Returns (img_filename, data, etag, last_modified), data is None on a 304.
+    """
+    img_filename = img_filename_for(url)
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    try:
+        with urlopen(Request(url, headers=headers)) as resp:
+            data = resp.read()
+            etag = resp.headers.get('ETag')
+            last_modified = resp.headers.get('Last-Modified')
+    except HTTPError as exc:
+        if exc.code != 304:
+            raise
+        logging.info("image at URL {} not modified".format(url))
+        return img_filename, None, etag, last_modified
+    logging.info("image [ {} bytes ] fetched from {}".format(len(data), url))
+    return img_filename, data, etag, last_modified
+
+
+def save_thumbnails(filename, fp, output_dir, target_sizes):
+    orig_img = Image.open(fp)
+    img_format = orig_img.format
+    for basewidth, img in resize_cascade(orig_img, target_sizes):
+        new_filename = os.path.splitext(filename)[0] + \
+            '_' + str(basewidth) + os.path.splitext(filename)[1]
+        # encode in memory and write the output with a single buffered write
+        buf = io.BytesIO()
+        img.save(buf, format=img_format)
+        with open(output_dir + os.path.sep + new_filename, 'wb') as f:
+            f.write(buf.getbuffer())
+    orig_img.close()
+
+
+def resize_image_bytes(filename, data, output_dir, target_sizes):
+    logging.info("resizing image {} from memory".format(filename))
+    save_thumbnails(filename, io.BytesIO(data), output_dir, target_sizes)
+    logging.info("done resizing image {}".format(filename))
+    return filename
+
+
+def resize_image_shared(filename, shm_name, size, output_dir, target_sizes):
+    # runs in a worker process, the image bytes are read from a shared memory
+    # block created by the parent instead of being pickled with the task
+    logging.info("resizing image {} from shared memory {}".format(filename, shm_name))
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        view = shm.buf[:size]
+        try:
+            with io.BufferedReader(MemoryViewReader(view)) as fp:
+                save_thumbnails(filename, fp, output_dir, target_sizes)
+        finally:
+            view.release()
+    finally:
+        shm.close()
+    logging.info("done resizing image {}".format(filename))
+    return filename
+
+
+def create_executor(kind, max_workers=None):
+    """Return a concurrent.futures executor for a stage.
+    'asyncio' returns None, which makes loop.run_in_executor fall back to
+    the event loop's default executor.
+    """
+    if kind == 'thread':
+        return ThreadPoolExecutor(max_workers=max_workers)
+    if kind == 'process':
+        return ProcessPoolExecutor(max_workers=max_workers)
+    if kind == 'asyncio':
+        return None
+    raise ValueError("executor must be one of {}, got {!r}".format(EXECUTOR_KINDS, kind))
+
+
+class ThumbnailMakerService(object):
+    def __init__(self, home_dir='.', dl_executor='thread', resize_executor='process',
+                 num_dl_workers=4, num_resize_workers=None, target_sizes=(32, 64, 200),
+                 in_memory=False, cache_dir=None, cache_max_bytes=None, downloader_options=None):
+        self.home_dir = home_dir
+        self.input_dir = self.home_dir + os.path.sep + 'incoming'
+        self.output_dir = self.home_dir + os.path.sep + 'outgoing'
+        self.dl_executor = dl_executor
+        self.resize_executor = resize_executor
+        self.num_dl_workers = num_dl_workers
+        self.num_resize_workers = num_resize_workers
+        self.target_sizes = list(target_sizes)
+        # keep downloaded bytes in memory instead of staging them in incoming/
+        self.in_memory = in_memory
+        # content addressed cache of generated thumbnails, shared across runs
+        self.cache = None
+        if cache_dir is not None:
+            if cache_max_bytes is None:
+                self.cache = ThumbnailCache(cache_dir)
+            else:
+                self.cache = ThumbnailCache(cache_dir, cache_max_bytes)
+        # extra AsyncDownloader settings (limit_per_host, timeout, retries, ...)
+        # for the 'asyncio' download stage, num_dl_workers bounds its concurrency
+        self.downloader_options = downloader_options or {}
+        self._dl_pool = self._resize_pool = self._dl_sem = self._mem_sem = self._downloader = None
+        self._digest_locks = None
+        # url -> exception for the images of the last batch that failed
+        self.failed_urls = {}
+        # validate executor kinds up front rather than halfway through a batch
+        for kind in (dl_executor, resize_executor):
+            if kind not in EXECUTOR_KINDS:
+                raise ValueError("executor must be one of {}, got {!r}".format(EXECUTOR_KINDS, kind))
+
+    async def download(self, url):
+        """Download url into the input dir and return its file name."""
+        img_filename = img_filename_for(url)
+        if self._downloader is not None:
+            await self._downloader.download(url, self.input_dir + os.path.sep + img_filename)
+            return img_filename
+        loop = asyncio.get_running_loop()
+        # the semaphore bounds concurrent downloads when the stage runs on the
+        # loop's shared default executor
+        async with self._dl_sem:
+            return await loop.run_in_executor(
+                self._dl_pool, download_image, url, self.input_dir)
+
+    async def fetch(self, url, etag=None, last_modified=None):
+        """Fetch url into memory, conditionally when validators are given.
+        Returns (img_filename, data, etag, last_modified), data is None on a 304.
+        """
+        if self._downloader is not None:
+            headers = {}
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+            data, resp_headers = await self._downloader.fetch(url, headers=headers)
+            if data is not None:
+                etag = resp_headers.get('ETag')
+                last_modified = resp_headers.get('Last-Modified')
+            return img_filename_for(url), data, etag, last_modified
+        loop = asyncio.get_running_loop()
+        async with self._dl_sem:
+            return await loop.run_in_executor(
+                self._dl_pool, fetch_image_conditional, url, etag, last_modified)
+
+    async def download_and_resize(self, url):
+        if self.cache is not None or self.in_memory:
+            # fetched bytes are held until their resize finishes, so only let a
+            # few images at a time sit between the two stages
+            async with self._mem_sem:
+                if self.cache is not None:
+                    return await self.cached_fetch_and_resize(url)
+                img_filename, data, _, _ = await self.fetch(url)
+                return await self.resize_bytes(img_filename, data, self.output_dir)
+        img_filename = await self.download(url)
+        # hand the image to the resize stage as soon as it lands
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._resize_pool, resize_image, img_filename,
+            self.input_dir, self.output_dir, self.target_sizes)
+
+    async def resize_bytes(self, img_filename, data, output_dir):
+        loop = asyncio.get_running_loop()
+        if self.resize_executor != 'process':
+            # threads share the bytes object directly
+            return await loop.run_in_executor(
+                self._resize_pool, resize_image_bytes, img_filename,
+                data, output_dir, self.target_sizes)
+
+        # hand the bytes to the worker process through shared memory
+        size = len(data)
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            shm.buf[:size] = data
+            del data
+            return await loop.run_in_executor(
+                self._resize_pool, resize_image_shared, img_filename,
+                shm.name, size, output_dir, self.target_sizes)
+        finally:
+            shm.close()
+            shm.unlink()
+
+    async def cached_fetch_and_resize(self, url):
+        loop = asyncio.get_running_loop()
+        widths = [basewidth for basewidth, _ in normalize_target_sizes(self.target_sizes)]
+        etag, last_modified = self.cache.validators(url)
+        digest = self.cache.digest_for_url(url)
+        if digest is None or not self.cache.has_sizes(digest, widths):
+            # nothing usable is cached for this url, skip the conditional request
+            etag = last_modified = None
+
+        img_filename, data, etag, last_modified = await self.fetch(url, etag, last_modified)
+        if data is not None:
+            # hashing releases the GIL, keep it off the event loop thread
+            digest = await loop.run_in_executor(None, hash_bytes, data)
+            self.cache.record_url(url, digest, etag, last_modified)
+
+        # urls with the same bytes in one batch wait for the first one's resize
+        async with self._digest_locks[digest]:
+            if self.cache.has_sizes(digest, widths):
+                logging.info("thumbnail cache hit for {}".format(url))
+            else:
+                # resize once per distinct image, straight into the cache
+                ext = os.path.splitext(img_filename)[1]
+                os.makedirs(self.cache.blob_dir(digest), exist_ok=True)
+                await self.resize_bytes(digest + ext, data, self.cache.blob_dir(digest))
+                self.cache.add_thumbnails(digest, ext, widths)
+        self.cache.materialize(digest, widths, img_filename, self.output_dir)
+        return img_filename
+
+    async def run_pipeline(self, img_url_list):
+        """Download and resize every url, returns the file names of the
+        images that made it; one bad url does not stop the others, the
+        failures are kept in failed_urls."""
+        self.failed_urls = {}
+        self._dl_pool = create_executor(self.dl_executor, self.num_dl_workers)
+        self._resize_pool = create_executor(self.resize_executor, self.num_resize_workers)
+        self._dl_sem = asyncio.Semaphore(self.num_dl_workers)
+        self._digest_locks = collections.defaultdict(asyncio.Lock)
+        # enough images in memory to keep every resize worker busy with one
+        # more fetched and waiting behind it
+        self._mem_sem = asyncio.Semaphore(2 * (self.num_resize_workers or os.cpu_count() or 1))
+        try:
+            tasks = [self.download_and_resize(url) for url in img_url_list]
+            if self.dl_executor == 'asyncio' and AsyncDownloader is not None:
+                async with AsyncDownloader(max_concurrency=self.num_dl_workers,
+                                           **self.downloader_options) as self._downloader:
+                    results = await asyncio.gather(*tasks, return_exceptions=True)
+            else:
+                results = await asyncio.gather(*tasks, return_exceptions=True)
+        finally:
+            self._downloader = None
+            for pool in (self._dl_pool, self._resize_pool):
+                if pool is not None:
+                    pool.shutdown(wait=True)
+            self._dl_pool = self._resize_pool = self._dl_sem = self._mem_sem = None
+            self._digest_locks = None
+
+        resized = []
+        for url, result in zip(img_url_list, results):
+            if isinstance(result, BaseException):
+                if not isinstance(result, Exception):
+                    # KeyboardInterrupt, CancelledError, ... stop the batch
+                    raise result
+                logging.error("failed to make thumbnails for {}: {!r}".format(url, result))
+                self.failed_urls[url] = result
+            else:
+                resized.append(result)
+        return resized
+
+    def make_thumbnails(self, img_url_list):
+        logging.info("START make_thumbnails")
+        # validate inputs
+        if not img_url_list:
+            return []
+        if not self.in_memory and self.cache is None:
+            os.makedirs(self.input_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        start = time.perf_counter()
+
+        logging.info("downloading with {} executor, resizing with {} executor".format(
+            self.dl_executor, self.resize_executor))
+        try:
+            resized = asyncio.run(self.run_pipeline(img_url_list))
+        finally:
+            if self.cache is not None:
+                self.cache.evict()
+                self.cache.save()
+
+        end = time.perf_counter()
+        if self.failed_urls:
+            logging.warning("{} of {} images failed: {}".format(
+                len(self.failed_urls), len(img_url_list), ', '.join(self.failed_urls)))
+        logging.info("END make_thumbnails: {} images in {} seconds".format(len(resized), end - start))
+        return resized
+
+
+if __name__ == '__main__':
+    from test_thumbnail_maker import IMG_URLS
+
+    tn_maker = ThumbnailMakerService()
+    tn_maker.make_thumbnails(IMG_URLS)
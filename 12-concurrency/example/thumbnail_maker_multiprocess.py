@@ -5,7 +5,7 @@ import logging
 import multiprocessing
 
 from threading import Thread
-from queue import Queue
+from queue import Queue, Empty
 
 from urllib.parse import urlparse
 from urllib.request import urlretrieve
@@ -19,26 +19,80 @@ FORMAT = "[%(threadName)s, %(asctime)s, %(levelname)s] %(message)s"
 logging.basicConfig(filename=filename, level=logging.DEBUG, format=FORMAT)
 
 
+# per worker process settings, filled in once by the pool initializer so each
+# task only has to pickle a file name instead of the whole service
+worker_config = {}
+
+
+def init_worker(input_dir, output_dir, target_sizes):
+    worker_config['input_dir'] = input_dir
+    worker_config['output_dir'] = output_dir
+    worker_config['target_sizes'] = target_sizes
+
+
+def resize_image(filename):
+    """Resize one downloaded image in a pool worker.
+    Returns the output paths with their sizes and the time spent, so the
+    parent can aggregate results instead of losing them in the worker.
+    """
+    input_dir = worker_config['input_dir']
+    output_dir = worker_config['output_dir']
+    start = time.perf_counter()
+    logging.info("resizing image {}".format(filename))
+    outputs = []
+    orig_img = Image.open(input_dir + os.path.sep + filename)
+    for basewidth in worker_config['target_sizes']:
+        img = orig_img
+        # calculate target height of the resized image to maintain the aspect ratio
+        wpercent = (basewidth / float(img.size[0]))
+        hsize = int((float(img.size[1]) * float(wpercent)))
+        # perform resizing
+        img = img.resize((basewidth, hsize), PIL.Image.LANCZOS)
+
+        # save the resized image to the output dir with a modified file name
+        new_filename = os.path.splitext(filename)[0] + \
+            '_' + str(basewidth) + os.path.splitext(filename)[1]
+        output_path = output_dir + os.path.sep + new_filename
+        img.save(output_path)
+        outputs.append((output_path, img.size))
+
+    os.remove(input_dir + os.path.sep + filename)
+    logging.info("done resizing image {}".format(filename))
+    return {
+        'filename': filename,
+        'outputs': outputs,
+        'duration': time.perf_counter() - start,
+        'worker': multiprocessing.current_process().name,
+    }
+
+
 class ThumbnailMakerService(object):
-    def __init__(self, home_dir='.'):
+    def __init__(self, home_dir='.', num_dl_threads=4, num_processes=None, target_sizes=(32, 64, 200)):
         self.home_dir = home_dir
         self.input_dir = self.home_dir + os.path.sep + 'incoming'
         self.output_dir = self.home_dir + os.path.sep + 'outgoing'
+        self.num_dl_threads = num_dl_threads
+        self.num_processes = num_processes or multiprocessing.cpu_count()
+        self.target_sizes = list(target_sizes)
         self.img_list = []
 
     def download_image(self, dl_queue):
-        while not dl_queue.empty():
-            # last item
+        while True:
             try:
                 url = dl_queue.get(block=False)
+            except Empty:
+                # no urls left for this thread
+                break
+            try:
                 # download each image and save to the input dir
                 img_filename = urlparse(url).path.split('/')[-1]
                 dest_path = self.input_dir + os.path.sep + img_filename
                 urlretrieve(url, dest_path)
                 self.img_list.append(img_filename)
+            except Exception:
+                logging.exception("failed to download {}".format(url))
+            finally:
                 dl_queue.task_done()
-            except Queue.empty:
-                logging.info("Queue empty")
             
     # def download_images(self, img_url_list):
     #     # validate inputs
@@ -93,50 +147,52 @@ class ThumbnailMakerService(object):
 
     #     logging.info("created {} thumbnails in {} seconds".format(num_images, end - start))
 
-    def resize_image(self, filename):
-        target_sizes = [32, 64, 200]
-        logging.info("resizing image {}".format(filename))
-        orig_img = Image.open(self.input_dir + os.path.sep + filename)
-        for basewidth in target_sizes:
-            img = orig_img
-            # calculate target height of the resized image to maintain the aspect ratio
-            wpercent = (basewidth / float(img.size[0]))
-            hsize = int((float(img.size[1]) * float(wpercent)))
-            # perform resizing
-            img = img.resize((basewidth, hsize), PIL.Image.LANCZOS)
-            
-            # save the resized image to the output dir with a modified file name 
-            new_filename = os.path.splitext(filename)[0] + \
-                '_' + str(basewidth) + os.path.splitext(filename)[1]
-            img.save(self.output_dir + os.path.sep + new_filename)
-
-        os.remove(self.input_dir + os.path.sep + filename)
-        logging.info("done resizing image {}".format(filename))
-
     def make_thumbnails(self, img_url_list):
         logging.info("START make_thumbnails")
         start = time.perf_counter()
+        os.makedirs(self.input_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.img_list = []
+
+        # start the pool once, up front, so worker start up overlaps the downloads
+        pool = multiprocessing.Pool(
+            processes=self.num_processes,
+            initializer=init_worker,
+            initargs=(self.input_dir, self.output_dir, self.target_sizes))
 
         dl_queue = Queue()
         # loading all download urls into the download queue
         for img_url in img_url_list:
             dl_queue.put(img_url)
 
-        num_dl_threads = 4 
-
-        for _ in range(num_dl_threads):
+        threads = []
+        for _ in range(self.num_dl_threads):
             t = Thread(target=self.download_image, args=(dl_queue,))
             t.start()
+            threads.append(t)
 
         # block main thread until all downloads complete
-        dl_queue.join()
-        pool = multiprocessing.Pool()
-        pool.map(self.resize_image, self.img_list)
-        pool.close()
-        pool.join()
-
+        for t in threads:
+            t.join()
+
+        # a few chunks per worker amortizes the ipc round trips while still
+        # balancing uneven images across the pool
+        chunksize = max(1, len(self.img_list) // (self.num_processes * 4))
+        results = []
+        try:
+            for result in pool.imap_unordered(resize_image, self.img_list, chunksize=chunksize):
+                results.append(result)
+        finally:
+            pool.close()
+            pool.join()
+
+        resize_time = sum(result['duration'] for result in results)
+        num_thumbnails = sum(len(result['outputs']) for result in results)
         end = time.perf_counter()
+        logging.info("created {} thumbnails for {} images, {} seconds of resize time".format(
+            num_thumbnails, len(results), resize_time))
         logging.info("END make_thumbnails in {} seconds".format(end - start))
+        return results
 
 
 if __name__ == '__main__':
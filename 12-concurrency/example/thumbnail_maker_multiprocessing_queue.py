@@ -5,13 +5,15 @@ import logging
 import multiprocessing
 
 from threading import Thread
-from queue import Queue
+from queue import Queue, Empty
 from urllib.parse import urlparse
 from urllib.request import urlretrieve
 
 import PIL
 from PIL import Image
 
+from stage_metrics import StageMetrics
+
 filename = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'logfile.log')
 
 FORMAT = "[%(threadName)s, %(asctime)s, %(levelname)s] %(message)s"
@@ -19,25 +21,43 @@ logging.basicConfig(filename=filename, level=logging.DEBUG, format=FORMAT)
 
 
 class ThumbnailMakerService(object):
-    def __init__(self, home_dir='.'):
+    def __init__(self, home_dir='.', num_dl_threads=4, num_processes=None, queue_size=8):
         self.home_dir = home_dir
         self.input_dir = self.home_dir + os.path.sep + 'incoming'
         self.output_dir = self.home_dir + os.path.sep + 'outgoing'
-        self.img_queue = multiprocessing.JoinableQueue()
+        self.num_dl_threads = num_dl_threads
+        self.num_processes = num_processes or multiprocessing.cpu_count()
+        # bounded queue: once queue_size images wait for resizing, downloaders
+        # block on put() instead of flooding memory and disk
+        self.img_queue = multiprocessing.JoinableQueue(maxsize=queue_size)
+        # each resize process sends its StageMetrics.as_dict() back on exit
+        self.metrics_queue = multiprocessing.Queue()
+        # metrics of the last make_thumbnails run, the resize stage merged
+        # over all processes
+        self.dl_metrics = StageMetrics('download')
+        self.resize_metrics = StageMetrics('resize')
 
     def download_image(self, dl_queue):
-        while not dl_queue.empty():
-            # last item
+        while True:
             try:
                 url = dl_queue.get(block=False)
+            except Empty:
+                # no urls left for this thread
+                break
+            try:
                 # download each image and save to the input dir
                 img_filename = urlparse(url).path.split('/')[-1]
                 dest_path = self.input_dir + os.path.sep + img_filename
                 urlretrieve(url, dest_path)
+                self.dl_metrics.record_item()
+                # blocks while the queue is at its high-water mark
+                start = time.perf_counter()
                 self.img_queue.put(img_filename)
+                self.dl_metrics.record_wait(time.perf_counter() - start, self.img_queue.qsize())
+            except Exception:
+                logging.exception("failed to download {}".format(url))
+            finally:
                 dl_queue.task_done()
-            except Queue.empty:
-                logging.info("Queue empty")
             
     # def download_images(self, img_url_list):
     #     # validate inputs
@@ -62,64 +82,90 @@ class ThumbnailMakerService(object):
     def perform_resizing(self):
         logging.info("beginning image resizing")
         target_sizes = [32, 64, 200]
-        num_images = len(os.listdir(self.input_dir))
+        num_images = 0
+        # metrics are per process, the parent merges them after shutdown
+        resize_metrics = StageMetrics('resize')
 
         start = time.perf_counter()
         while True:
+            wait_start = time.perf_counter()
             filename = self.img_queue.get()
+            resize_metrics.record_wait(time.perf_counter() - wait_start, self.img_queue.qsize())
             if not filename:
                 # empty file means done with the image downloading, i.e. no more items from the queue
                 self.img_queue.task_done()
                 break
-            logging.info("resizing image {}".format(filename))
-            orig_img = Image.open(self.input_dir + os.path.sep + filename)
-            for basewidth in target_sizes:
-                img = orig_img
-                # calculate target height of the resized image to maintain the aspect ratio
-                wpercent = (basewidth / float(img.size[0]))
-                hsize = int((float(img.size[1]) * float(wpercent)))
-                # perform resizing
-                img = img.resize((basewidth, hsize), PIL.Image.LANCZOS)
-                
-                # save the resized image to the output dir with a modified file name 
-                new_filename = os.path.splitext(filename)[0] + \
-                    '_' + str(basewidth) + os.path.splitext(filename)[1]
-                img.save(self.output_dir + os.path.sep + new_filename)
-
-            os.remove(self.input_dir + os.path.sep + filename)
-            logging.info("done resizing image {}".format(filename))
-            self.img_queue.task_done()
+            try:
+                logging.info("resizing image {}".format(filename))
+                orig_img = Image.open(self.input_dir + os.path.sep + filename)
+                for basewidth in target_sizes:
+                    img = orig_img
+                    # calculate target height of the resized image to maintain the aspect ratio
+                    wpercent = (basewidth / float(img.size[0]))
+                    hsize = int((float(img.size[1]) * float(wpercent)))
+                    # perform resizing
+                    img = img.resize((basewidth, hsize), PIL.Image.LANCZOS)
+
+                    # save the resized image to the output dir with a modified file name
+                    new_filename = os.path.splitext(filename)[0] + \
+                        '_' + str(basewidth) + os.path.splitext(filename)[1]
+                    img.save(self.output_dir + os.path.sep + new_filename)
+
+                os.remove(self.input_dir + os.path.sep + filename)
+                logging.info("done resizing image {}".format(filename))
+                resize_metrics.record_item()
+                num_images += 1
+            except Exception:
+                # keep consuming, a dead consumer would leave the bounded queue full
+                logging.exception("failed to resize {}".format(filename))
+            finally:
+                self.img_queue.task_done()
         end = time.perf_counter()
 
+        self.metrics_queue.put(resize_metrics.as_dict())
         logging.info("created {} thumbnails in {} seconds".format(num_images, end - start))
 
     def make_thumbnails(self, img_url_list):
         logging.info("START make_thumbnails")
         start = time.perf_counter()
+        os.makedirs(self.input_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
 
         dl_queue = Queue()
         # loading all download urls into the download queue
         for img_url in img_url_list:
             dl_queue.put(img_url)
 
-        num_dl_threads = 4 
-
-        for _ in range(num_dl_threads):
+        self.dl_metrics = StageMetrics('download')
+        self.resize_metrics = StageMetrics('resize')
+        dl_threads = []
+        for _ in range(self.num_dl_threads):
             t = Thread(target=self.download_image, args=(dl_queue,))
             t.start()
-        
-        num_processes = multiprocessing.cpu_count()
-        for _ in range(num_processes):
+            dl_threads.append(t)
+
+        processes = []
+        for _ in range(self.num_processes):
             p = multiprocessing.Process(target=self.perform_resizing)
             p.start()
+            processes.append(p)
 
         # block main thread until all downloads complete
-        dl_queue.join()
-        # put poison pill
-        for _ in range(num_processes):
+        for t in dl_threads:
+            t.join()
+        # put one poison pill per consumer, each consumer exits on the first one it sees
+        for _ in processes:
             self.img_queue.put(None)
 
+        # drain the metrics before joining so no child blocks on a full pipe
+        for _ in processes:
+            self.resize_metrics.merge(self.metrics_queue.get())
+        for p in processes:
+            p.join()
+
         end = time.perf_counter()
+        logging.info(str(self.dl_metrics))
+        logging.info(str(self.resize_metrics))
         logging.info("END make_thumbnails in {} seconds".format(end - start))
 
 if __name__ == '__main__':
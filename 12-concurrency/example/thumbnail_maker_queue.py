@@ -4,13 +4,15 @@ import os
 import logging
 
 from threading import Thread
-from queue import Queue
+from queue import Queue, Empty
 from urllib.parse import urlparse
 from urllib.request import urlretrieve
 
 import PIL
 from PIL import Image
 
+from stage_metrics import StageMetrics
+
 filename = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'logfile.log')
 
 FORMAT = "[%(threadName)s, %(asctime)s, %(levelname)s] %(message)s"
@@ -18,26 +20,40 @@ logging.basicConfig(filename=filename, level=logging.DEBUG, format=FORMAT)
 
 
 class ThumbnailMakerService(object):
-    def __init__(self, home_dir='.'):
+    def __init__(self, home_dir='.', num_dl_threads=4, num_resize_threads=2, queue_size=8):
         self.home_dir = home_dir
         self.input_dir = self.home_dir + os.path.sep + 'incoming'
         self.output_dir = self.home_dir + os.path.sep + 'outgoing'
-        self.img_queue = Queue()
+        self.num_dl_threads = num_dl_threads
+        self.num_resize_threads = num_resize_threads
+        # bounded queue: once queue_size images wait for resizing, downloaders
+        # block on put() instead of flooding memory and disk
+        self.img_queue = Queue(maxsize=queue_size)
         self.dl_queue = Queue()
+        self.dl_metrics = StageMetrics('download')
+        self.resize_metrics = StageMetrics('resize')
 
     def download_image(self):
-        while not self.dl_queue.empty():
-            # last item
+        while True:
             try:
                 url = self.dl_queue.get(block=False)
+            except Empty:
+                # no urls left for this thread
+                break
+            try:
                 # download each image and save to the input dir
                 img_filename = urlparse(url).path.split('/')[-1]
                 dest_path = self.input_dir + os.path.sep + img_filename
                 urlretrieve(url, dest_path)
+                self.dl_metrics.record_item()
+                # blocks while the queue is at its high-water mark
+                start = time.perf_counter()
                 self.img_queue.put(img_filename)
+                self.dl_metrics.record_wait(time.perf_counter() - start, self.img_queue.qsize())
+            except Exception:
+                logging.exception("failed to download {}".format(url))
+            finally:
                 self.dl_queue.task_done()
-            except Queue.empty:
-                logging.info("Queue empty")
             
     # def download_images(self, img_url_list):
     #     # validate inputs
@@ -62,33 +78,42 @@ class ThumbnailMakerService(object):
     def perform_resizing(self):
         logging.info("beginning image resizing")
         target_sizes = [32, 64, 200]
-        num_images = len(os.listdir(self.input_dir))
+        num_images = 0
 
         start = time.perf_counter()
         while True:
+            wait_start = time.perf_counter()
             filename = self.img_queue.get()
+            self.resize_metrics.record_wait(time.perf_counter() - wait_start, self.img_queue.qsize())
             if not filename:
                 # empty file means done with the image downloading, i.e. no more items from the queue
                 self.img_queue.task_done()
                 break
-            logging.info("resizing image {}".format(filename))
-            orig_img = Image.open(self.input_dir + os.path.sep + filename)
-            for basewidth in target_sizes:
-                img = orig_img
-                # calculate target height of the resized image to maintain the aspect ratio
-                wpercent = (basewidth / float(img.size[0]))
-                hsize = int((float(img.size[1]) * float(wpercent)))
-                # perform resizing
-                img = img.resize((basewidth, hsize), PIL.Image.LANCZOS)
+            try:
+                logging.info("resizing image {}".format(filename))
+                orig_img = Image.open(self.input_dir + os.path.sep + filename)
+                for basewidth in target_sizes:
+                    img = orig_img
+                    # calculate target height of the resized image to maintain the aspect ratio
+                    wpercent = (basewidth / float(img.size[0]))
+                    hsize = int((float(img.size[1]) * float(wpercent)))
+                    # perform resizing
+                    img = img.resize((basewidth, hsize), PIL.Image.LANCZOS)
                 
-                # save the resized image to the output dir with a modified file name 
-                new_filename = os.path.splitext(filename)[0] + \
-                    '_' + str(basewidth) + os.path.splitext(filename)[1]
-                img.save(self.output_dir + os.path.sep + new_filename)
-
-            os.remove(self.input_dir + os.path.sep + filename)
-            logging.info("done resizing image {}".format(filename))
-            self.img_queue.task_done()
+                    # save the resized image to the output dir with a modified file name 
+                    new_filename = os.path.splitext(filename)[0] + \
+                        '_' + str(basewidth) + os.path.splitext(filename)[1]
+                    img.save(self.output_dir + os.path.sep + new_filename)
+
+                os.remove(self.input_dir + os.path.sep + filename)
+                logging.info("done resizing image {}".format(filename))
+                self.resize_metrics.record_item()
+                num_images += 1
+            except Exception:
+                # keep consuming, a dead consumer would leave the bounded queue full
+                logging.exception("failed to resize {}".format(filename))
+            finally:
+                self.img_queue.task_done()
         end = time.perf_counter()
 
         logging.info("created {} thumbnails in {} seconds".format(num_images, end - start))
@@ -96,28 +121,41 @@ class ThumbnailMakerService(object):
     def make_thumbnails(self, img_url_list):
         logging.info("START make_thumbnails")
         start = time.perf_counter()
+        os.makedirs(self.input_dir, exist_ok=True)
+        os.makedirs(self.output_dir, exist_ok=True)
+
+        # fresh metrics for every run, read them from the service afterwards
+        self.dl_metrics = StageMetrics('download')
+        self.resize_metrics = StageMetrics('resize')
 
         # loading all download urls into the download queue
         for img_url in img_url_list:
             self.dl_queue.put(img_url)
 
-        num_dl_threads = 4 
-
-        for _ in range(num_dl_threads):
+        dl_threads = []
+        for _ in range(self.num_dl_threads):
             t = Thread(target=self.download_image)
             t.start()
-        
-        t2 = Thread(target=self.perform_resizing)
+            dl_threads.append(t)
 
-        t2.start()
+        resize_threads = []
+        for _ in range(self.num_resize_threads):
+            t = Thread(target=self.perform_resizing)
+            t.start()
+            resize_threads.append(t)
 
         # block main thread until all downloads complete
-        self.dl_queue.join()
-        # put poison pill
-        self.img_queue.put(None) 
-        t2.join()
+        for t in dl_threads:
+            t.join()
+        # put one poison pill per consumer, each consumer exits on the first one it sees
+        for _ in resize_threads:
+            self.img_queue.put(None)
+        for t in resize_threads:
+            t.join()
 
         end = time.perf_counter()
+        logging.info(str(self.dl_metrics))
+        logging.info(str(self.resize_metrics))
         logging.info("END make_thumbnails in {} seconds".format(end - start))
 
 if __name__ == '__main__':
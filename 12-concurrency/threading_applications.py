@@ -33,6 +33,19 @@ def run_thread_workers(work, data):
     return results
 
 
+# the version above keeps every future alive at once and the set drops duplicate
+# results and their order. bounded_map (example/bounded_executor.py) keeps at most
+# max_in_flight tasks pending, so it can stream an iterable of any length, and
+# yields results in input order (or as completed with ordered=False)
+# example/ is a namespace package when run from this directory
+from example.bounded_executor import bounded_map
+
+def run_thread_workers_bounded(work, data):
+    """Run thread workers that invoke work on each data element, yielding
+    the results in order as they are ready."""
+    yield from bounded_map(work, data, executor='thread', max_in_flight=32)
+
+
 def main():
     original_data = {num for num in range(5)}
     expected_data = {(item * 2) for item in original_data}
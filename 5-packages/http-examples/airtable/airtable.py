@@ -3,12 +3,16 @@ import sys
 import requests 
 from collections import OrderedDict
 import posixpath 
-import time 
 import json 
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from six.moves.urllib.parse import unquote, quote
 
 from .auth import AirtableAuth
 from .params import AirtableParams
+from .limiter import bucket_for
 
 try:
     IS_IPY = sys.implementation.name == "ironpython"
@@ -16,16 +20,48 @@ except AttributeError:
     IS_IPY = False
 
 
+@lru_cache(maxsize=None)
+def _param_class(param_name):
+    # the name -> ParamClass lookup never changes, only do it once per name
+    return AirtableParams._get(param_name)
+
+
+class BatchWriteError(Exception):
+    """Some chunks of a batch write failed, the others were written.
+
+    records holds the records of the chunks that were written, in input
+    order, succeeded the indexes of those chunks and failed a
+    (chunk index, chunk, exception) triple for every chunk that was not.
+    Chunks are MAX_RECORDS_PER_REQUEST items of the input, in order, so
+    the failed ones can be sent again as they are.
+    """
+
+    def __init__(self, records, succeeded, failed):
+        super().__init__("{} of {} chunks failed, first error: {}".format(
+            len(failed), len(succeeded) + len(failed), failed[0][2]))
+        self.records = records
+        self.succeeded = succeeded
+        self.failed = failed
+
+
 class Airtable:
     VERSION = "v0"
     API_BASE_URL = "https://api.airtable.com/"
     API_LIMIT = 1.0 / 5  # 5 per second
     API_URL = posixpath.join(API_BASE_URL, VERSION)
+    MAX_RECORDS_PER_REQUEST = 10  # batch endpoints accept at most 10 records
+    MAX_WORKERS = 4
+    MAX_RETRIES = 5
+    RETRY_BACKOFF = 1.0  # seconds, doubled on every further 429
 
     def __init__(self, base_key, table_name, api_key=None):
         session = requests.Session()
         session.auth = AirtableAuth(api_key=api_key)
         self.session = session 
+        self.base_key = base_key
+        # every request takes a token from the bucket of its base, so batch
+        # workers and other instances on the same base together stay under API_LIMIT
+        self.limiter = bucket_for(base_key, 1.0 / self.API_LIMIT)
         self.table_name = table_name
         url_safe_table_name = quote(table_name, safe="")
         self.url_table = posixpath.join(self.API_URL, base_key, url_safe_table_name)
@@ -36,8 +72,7 @@ class Airtable:
         """
         new_params = OrderedDict()
         for param_name, param_value in sorted(params.items()):
-            param_value = params[param_name]
-            ParamClass = AirtableParams._get(param_name)
+            ParamClass = _param_class(param_name)
             new_params.update(ParamClass(param_value).to_param_dict())
         return new_params
 
@@ -65,8 +100,19 @@ class Airtable:
         return posixpath.join(self.url_table, record_id)
 
     def _request(self, method, url, params=None, json_data=None):
-        response = self.session.request(method, url, params=params, json=json_data)
-        return self._process_response(response)
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            response = self.session.request(method, url, params=params, json=json_data)
+            if response.status_code != 429 or attempt >= self.MAX_RETRIES:
+                return self._process_response(response)
+            # too many requests: pause the whole base, honouring Retry-After if sent
+            try:
+                delay = float(response.headers["Retry-After"])
+            except (KeyError, ValueError):
+                delay = self.RETRY_BACKOFF * 2 ** attempt
+            self.limiter.pause(delay)
+            attempt += 1
     
     def _get(self, url, **params):
         processed_params = self._process_params(params)
@@ -92,16 +138,59 @@ class Airtable:
     def get_iter(self, **options):
         """record restriver iterator 
         Returns iterator with lists in batches
+        The next page is fetched on a background thread while the caller
+        works through the current one.
         """
-        offset=None
-        while True:
-            data = self._get(self.url_table, offset=offset, **options)
-            records = data.get('records', [])
-            time.sleep(self.API_LIMIT)
-            yield records 
-            offset = data.get("offset")
-            if not offset:
-                break 
+        pages = queue.Queue(maxsize=1)
+        stop = threading.Event()
+
+        # process the options once, only the offset changes from page to page
+        params = self._process_params(options)
+
+        def put(item):
+            # give up once the caller has stopped reading, nobody would take it
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def fetch_pages():
+            offset = None
+            try:
+                while not stop.is_set():
+                    page_params = params.copy()
+                    if offset:
+                        page_params["offset"] = offset
+                    data = self._request("get", self.url_table, params=page_params)
+                    offset = data.get("offset")
+                    if not put((data.get("records", []), None)) or not offset:
+                        break
+            except Exception as exc:
+                put((None, exc))
+            put((None, None))
+
+        fetcher = threading.Thread(target=fetch_pages, daemon=True)
+        fetcher.start()
+        try:
+            while True:
+                records, error = pages.get()
+                if error is not None:
+                    raise error
+                if records is None:
+                    break
+                yield records
+        finally:
+            # the caller may stop early. The fetcher is a daemon thread and
+            # finishes its request (limiter waits and retries included) on its
+            # own, then sees stop; drop the page it may have queued and return
+            stop.set()
+            try:
+                pages.get_nowait()
+            except queue.Empty:
+                pass
     
     def get_all(self, **options):
         all_records = []
@@ -110,3 +199,68 @@ class Airtable:
         return all_records 
 
     
+
+    # batch writes
+    # the API takes at most 10 records per request, so records are chunked and
+    # the chunks sent from a small thread pool; the shared limiter keeps the
+    # pool as a whole at API_LIMIT
+    def _chunks(self, iterable):
+        chunk = []
+        for item in iterable:
+            chunk.append(item)
+            if len(chunk) == self.MAX_RECORDS_PER_REQUEST:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _batch_request(self, send, iterable, max_workers=None):
+        """Call send(chunk) for every chunk of iterable on a worker pool and
+        return the records of all responses, in input order.
+        A failed chunk does not stop the others; once all are done a
+        BatchWriteError says which chunks were written and which were not."""
+        records = []
+        succeeded, failed = [], []
+        with ThreadPoolExecutor(max_workers=max_workers or self.MAX_WORKERS) as executor:
+            futures = [(chunk, executor.submit(send, chunk)) for chunk in self._chunks(iterable)]
+            for index, (chunk, future) in enumerate(futures):
+                try:
+                    response = future.result()
+                except Exception as exc:
+                    failed.append((index, chunk, exc))
+                else:
+                    succeeded.append(index)
+                    records.extend(response.get("records", []))
+        if failed:
+            raise BatchWriteError(records, succeeded, failed)
+        return records
+
+    def batch_insert(self, records, typecast=False, max_workers=None):
+        """Create records from a list of field dicts, returns the created records"""
+        def send(chunk):
+            json_data = {"records": [{"fields": fields} for fields in chunk], "typecast": typecast}
+            return self._post(self.url_table, json_data)
+        return self._batch_request(send, records, max_workers)
+
+    def batch_update(self, records, typecast=False, max_workers=None):
+        """Update fields of records given as {"id": ..., "fields": {...}} dicts"""
+        def send(chunk):
+            return self._patch(self.url_table, {"records": chunk, "typecast": typecast})
+        return self._batch_request(send, records, max_workers)
+
+    def batch_upsert(self, records, key_fields, typecast=False, max_workers=None):
+        """Update the record whose key_fields match each field dict, or create it"""
+        def send(chunk):
+            json_data = {
+                "records": [{"fields": fields} for fields in chunk],
+                "performUpsert": {"fieldsToMergeOn": list(key_fields)},
+                "typecast": typecast,
+            }
+            return self._patch(self.url_table, json_data)
+        return self._batch_request(send, records, max_workers)
+
+    def batch_delete(self, record_ids, max_workers=None):
+        """Delete records by id, returns the {"id": ..., "deleted": True} dicts"""
+        def send(chunk):
+            return self._request("delete", self.url_table, params={"records[]": chunk})
+        return self._batch_request(send, record_ids, max_workers)
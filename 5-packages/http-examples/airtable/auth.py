@@ -0,0 +1,23 @@
+# https://github.com/gtalarico/airtable-python-wrapper/blob/master/airtable/auth.py
+import os
+import requests
+
+
+class AirtableAuth(requests.auth.AuthBase):
+    def __init__(self, api_key=None):
+        """
+        Authentication used by Airtable Class
+        the key is taken from api_key or the AIRTABLE_API_KEY env variable
+        """
+        try:
+            self.api_key = api_key or os.environ["AIRTABLE_API_KEY"]
+        except KeyError:
+            raise KeyError(
+                "Api Key not found. Pass api_key as a kwarg "
+                "or set an env var AIRTABLE_API_KEY with your key"
+            )
+
+    def __call__(self, request):
+        auth_token = {"Authorization": "Bearer {}".format(self.api_key)}
+        request.headers.update(auth_token)
+        return request
@@ -0,0 +1,59 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread safe token bucket: rate requests per second, bursts up to capacity.
+    acquire() blocks until a token is available, so any number of worker
+    threads can share one bucket and together stay under the rate.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds):
+        """Hand out no tokens for the next seconds, e.g. after the server
+        answered 429, so every thread sharing the bucket backs off."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            # start refilling from empty once the pause is over
+            self._tokens = 0.0
+            self._updated = self._paused_until
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._refill()
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            # sleep outside the lock so other threads can refill and check too
+            time.sleep(wait)
+
+
+# the rate limit applies per base, so all Airtable instances of a base in this
+# process share one bucket
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for(key, rate):
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(rate)
+        return _buckets[key]
@@ -0,0 +1,163 @@
+import json
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+# records changed while a sync is running may carry a timestamp slightly
+# before the sync started, so each delta looks back a little further
+SYNC_OVERLAP = timedelta(seconds=60)
+
+# sync options that decide which records a sync sees
+SCOPE_OPTIONS = ("view", "formula", "max_records")
+
+
+class AirtableMirror:
+    """Local SQLite copy of one Airtable table, keyed by record id.
+
+    sync() pulls only the records modified since the previous sync, lookups
+    and filters then run against the local file instead of the API.
+    Incremental syncs cannot see deletions, sync(full=True) pulls the whole
+    table and drops local records that are gone.
+
+    A sync with a view, formula or max_records only sees part of the table,
+    its scope. Every scope has its own last sync time, and a full sync of a
+    scope only drops records that were synced in that scope and are gone
+    from it, records another scope also holds stay.
+    """
+
+    def __init__(self, airtable, db_path, modified_field=None):
+        self.airtable = airtable
+        # None uses LAST_MODIFIED_TIME(), otherwise a "last modified time" field
+        self.modified_field = modified_field
+        self.db = sqlite3.connect(db_path)
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS records (
+                id TEXT PRIMARY KEY,
+                created_time TEXT,
+                fields TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            CREATE TABLE IF NOT EXISTS scopes (
+                scope TEXT NOT NULL,
+                id TEXT NOT NULL,
+                PRIMARY KEY (scope, id)
+            );
+        """)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _meta(self, key):
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    @property
+    def last_sync(self):
+        """Time of the last sync of the whole table"""
+        return self._meta(self._sync_key(""))
+
+    @staticmethod
+    def _scope(options):
+        selection = {name: options[name] for name in SCOPE_OPTIONS if name in options}
+        return json.dumps(selection, sort_keys=True) if selection else ""
+
+    @staticmethod
+    def _sync_key(scope):
+        return "last_sync:" + scope if scope else "last_sync"
+
+    def _delta_formula(self, since):
+        modified = "{%s}" % self.modified_field if self.modified_field else "LAST_MODIFIED_TIME()"
+        return "IS_AFTER(%s, DATETIME_PARSE('%s'))" % (modified, since)
+
+    def sync(self, full=False, **options):
+        """Pull new and changed records, returns the number stored"""
+        started = datetime.now(timezone.utc)
+        scope = self._scope(options)
+        since = None if full else self._meta(self._sync_key(scope))
+        if since:
+            delta = self._delta_formula(since)
+            formula = options.get("formula")
+            options["formula"] = "AND(%s, %s)" % (formula, delta) if formula else delta
+        seen = set()
+        count = 0
+        with self.db:
+            # one page at a time, the table is never held in memory as a whole
+            for records in self.airtable.get_iter(**options):
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO records (id, created_time, fields) VALUES (?, ?, ?)",
+                    [(r["id"], r.get("createdTime"), json.dumps(r.get("fields", {})))
+                     for r in records])
+                self.db.executemany("INSERT OR IGNORE INTO scopes (scope, id) VALUES (?, ?)",
+                                    [(scope, r["id"]) for r in records])
+                count += len(records)
+                if full:
+                    seen.update(r["id"] for r in records)
+            if full:
+                self._drop_unseen(scope, seen)
+            self._set_meta(self._sync_key(scope),
+                           (started - SYNC_OVERLAP).strftime("%Y-%m-%dT%H:%M:%S.000Z"))
+        return count
+
+    def _drop_unseen(self, scope, seen):
+        if scope:
+            # the scope no longer holds the records it did not return, they
+            # are dropped unless another scope still does
+            gone = [(scope, row[0]) for row in
+                    self.db.execute("SELECT id FROM scopes WHERE scope = ?", (scope,))
+                    if row[0] not in seen]
+            self.db.executemany("DELETE FROM scopes WHERE scope = ? AND id = ?", gone)
+            self.db.executemany(
+                "DELETE FROM records WHERE id = ? AND NOT EXISTS "
+                "(SELECT 1 FROM scopes WHERE scopes.id = records.id)",
+                [(record_id,) for _, record_id in gone])
+        else:
+            # the whole table was seen, anything else is gone
+            gone = [(row[0],) for row in self.db.execute("SELECT id FROM records")
+                    if row[0] not in seen]
+            self.db.executemany("DELETE FROM records WHERE id = ?", gone)
+            self.db.executemany("DELETE FROM scopes WHERE id = ?", gone)
+
+    # local reads
+    def _record(self, row):
+        return {"id": row[0], "createdTime": row[1], "fields": json.loads(row[2])}
+
+    def _field_path(self, name):
+        return '$."%s"' % name.replace('"', '\\"')
+
+    def get(self, record_id):
+        row = self.db.execute("SELECT id, created_time, fields FROM records WHERE id = ?",
+                              (record_id,)).fetchone()
+        return self._record(row) if row else None
+
+    def filter(self, **field_values):
+        """Yield records whose fields equal all the given values"""
+        where = " AND ".join(["json_extract(fields, ?) = ?"] * len(field_values)) or "1"
+        args = []
+        for name, value in field_values.items():
+            args.extend([self._field_path(name), value])
+        cursor = self.db.execute(
+            "SELECT id, created_time, fields FROM records WHERE %s ORDER BY id" % where, args)
+        for row in cursor:
+            yield self._record(row)
+
+    def lookup(self, field_name, value):
+        """First record whose field_name equals value, or None"""
+        return next(self.filter(**{field_name: value}), None)
+
+    def iter_records(self):
+        """Stream every local record, rows are read from the cursor as needed"""
+        return self.filter()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM records").fetchone()[0]
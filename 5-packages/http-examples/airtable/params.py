@@ -0,0 +1,145 @@
+# https://github.com/gtalarico/airtable-python-wrapper/blob/master/airtable/params.py
+# maps the keyword arguments of get_iter / get_all to the query parameters
+# of the Airtable API
+from collections import OrderedDict
+
+
+class _BaseParam:
+    def __init__(self, value):
+        self.value = value
+
+    def to_param_dict(self):
+        return {self.param_name: self.value}
+
+
+class _BaseStringArrayParam(_BaseParam):
+    """
+    Api Expects Array Of Strings:
+    >>> ['FieldOne', 'Field2']
+
+    Requests Params Input:
+    >>> params={'fields': ['FieldOne', 'FieldTwo']}
+
+    Requests Url Params Encoding:
+    >>> ?fields=FieldOne&fields=FieldTwo
+
+    Expected Url Params:
+    >>> ?fields[]=FieldOne&fields[]=FieldTwo
+    """
+
+    def to_param_dict(self):
+        encoded_param = self.param_name + "[]"
+        return {encoded_param: self.value}
+
+
+class _BaseObjectArrayParam(_BaseParam):
+    """
+    Api Expects Array of Objects:
+    >>> [{field: "UUID", direction: "desc"}, {...}]
+
+    Expected Url Params:
+    >>> ?sort[0][field]=UUID&sort[0][direction]=desc
+    """
+
+    def to_param_dict(self):
+        param_dict = {}
+        for index, dictionary in enumerate(self.value):
+            for key, value in dictionary.items():
+                param_name = "{param_name}[{index}][{key}]".format(
+                    param_name=self.param_name, index=index, key=key
+                )
+                param_dict[param_name] = value
+        return OrderedDict(sorted(param_dict.items()))
+
+
+class AirtableParams:
+    class MaxRecordsParam(_BaseParam):
+        # maximum total number of records that will be returned
+        param_name = "maxRecords"
+        kwarg = "max_records"
+
+    class ViewParam(_BaseParam):
+        # name or id of a view, only its records are returned, in its order
+        param_name = "view"
+        kwarg = param_name
+
+    class PageSizeParam(_BaseParam):
+        # number of records per page, at most 100
+        param_name = "pageSize"
+        kwarg = "page_size"
+
+    class FormulaParam(_BaseParam):
+        # only records for which the formula is truthy are returned
+        param_name = "filterByFormula"
+        kwarg = "formula"
+
+    class _OffsetParam(_BaseParam):
+        # set by get_iter, the server's pointer to the next page
+        param_name = "offset"
+        kwarg = param_name
+
+    class FieldsParam(_BaseStringArrayParam):
+        # only these fields are returned
+        param_name = "fields"
+        kwarg = param_name
+
+    class SortParam(_BaseObjectArrayParam):
+        # field names, a leading "-" or a (field, direction) pair sorts descending
+        param_name = "sort"
+        kwarg = param_name
+
+        def __init__(self, value):
+            # wraps a single string into a list to avoid iterating its characters
+            if hasattr(value, "startswith"):
+                value = [value]
+            self.value = []
+            for item in value:
+                direction = "asc"
+                if not hasattr(item, "startswith"):
+                    field_name, direction = item
+                elif item.startswith("-"):
+                    direction = "desc"
+                    field_name = item[1:]
+                else:
+                    field_name = item
+                self.value.append({"field": field_name, "direction": direction})
+
+    class CellFormatParam(_BaseParam):
+        # "json" or "string"
+        param_name = "cellFormat"
+        kwarg = "cell_format"
+
+    class TimeZoneParam(_BaseParam):
+        param_name = "timeZone"
+        kwarg = "time_zone"
+
+    class UserLocaleParam(_BaseParam):
+        param_name = "userLocale"
+        kwarg = "user_locale"
+
+    @classmethod
+    def _discover_params(cls):
+        """Returns a dict where filter keyword is key, and class is value.
+        Both the keyword argument and the api's own name are accepted."""
+        try:
+            return cls.filters
+        except AttributeError:
+            filters = {}
+            for param_class_name in dir(cls):
+                param_class = getattr(cls, param_class_name)
+                if hasattr(param_class, "kwarg"):
+                    filters[param_class.kwarg] = param_class
+                    filters[param_class.param_name] = param_class
+            cls.filters = filters
+        return cls.filters
+
+    @classmethod
+    def _get(cls, kwarg_name):
+        """Returns a Param Class Instance, by its kwarg or param name"""
+        param_classes = cls._discover_params()
+        try:
+            param_class = param_classes[kwarg_name]
+        except KeyError:
+            raise ValueError("invalid param keyword {}".format(kwarg_name))
+        else:
+            return param_class
@@ -0,0 +1,139 @@
+import itertools
+import json
+import random
+import threading
+import time
+
+import pytest
+import requests
+
+from .airtable import Airtable, BatchWriteError
+
+_bases = itertools.count()
+
+
+def response(status_code, data):
+    resp = requests.Response()
+    resp.status_code = status_code
+    resp.reason = "OK" if status_code < 400 else "Error"
+    resp.url = "https://api.airtable.com/v0/test"
+    resp._content = json.dumps(data).encode("utf-8")
+    return resp
+
+
+class FakeSession:
+    """Stands in for session.request, keeps every call and answers with
+    handler(method, params, json_data)"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def request(self, method, url, params=None, json=None):
+        with self.lock:
+            self.calls.append((method, params, json))
+        # finish out of order, the results must still come back in input order
+        time.sleep(random.uniform(0, 0.01))
+        return self.handler(method, params, json)
+
+
+def airtable(handler):
+    # a base of its own, so tests do not share a rate limit bucket
+    table = Airtable("app{}".format(next(_bases)), "Table", api_key="key")
+    table.session = FakeSession(handler)
+    return table
+
+
+def created(method, params, json_data):
+    return response(200, {"records": [
+        {"id": "rec" + str(record["fields"]["n"]), "fields": record["fields"]}
+        for record in json_data["records"]]})
+
+
+def test_batch_insert_chunks_to_ten_in_order():
+    table = airtable(created)
+    records = table.batch_insert([{"n": n} for n in range(25)], typecast=True)
+    assert [r["id"] for r in records] == ["rec{}".format(n) for n in range(25)]
+    calls = sorted(table.session.calls, key=lambda call: call[2]["records"][0]["fields"]["n"])
+    assert [len(call[2]["records"]) for call in calls] == [10, 10, 5]
+    method, params, json_data = calls[0]
+    assert method == "post" and params is None
+    assert json_data == {"records": [{"fields": {"n": n}} for n in range(10)], "typecast": True}
+
+
+def test_batch_upsert_payload():
+    table = airtable(created)
+    table.batch_upsert([{"n": n, "Name": str(n)} for n in range(12)], key_fields=("Name",))
+    method, params, json_data = table.session.calls[0]
+    assert method == "patch"
+    assert json_data["performUpsert"] == {"fieldsToMergeOn": ["Name"]}
+    assert json_data["typecast"] is False
+    assert all(set(record) == {"fields"} for record in json_data["records"])
+
+
+def test_batch_delete_payload():
+    def deleted(method, params, json_data):
+        return response(200, {"records": [{"id": i, "deleted": True} for i in params["records[]"]]})
+
+    table = airtable(deleted)
+    ids = ["rec{}".format(n) for n in range(15)]
+    assert [r["id"] for r in table.batch_delete(ids)] == ids
+    assert sorted(call[1]["records[]"] for call in table.session.calls) == [ids[:10], ids[10:]]
+    assert all(call[0] == "delete" and call[2] is None for call in table.session.calls)
+
+
+def test_failed_chunks_are_reported_with_the_written_ones():
+    def handler(method, params, json_data):
+        if any(record["fields"]["n"] in (12, 31) for record in json_data["records"]):
+            return response(422, {"error": {"type": "INVALID_VALUE_FOR_COLUMN"}})
+        return created(method, params, json_data)
+
+    table = airtable(handler)
+    with pytest.raises(BatchWriteError) as exc_info:
+        table.batch_insert([{"n": n} for n in range(45)])
+    error = exc_info.value
+    # every chunk was still sent
+    assert len(table.session.calls) == 5
+    assert error.succeeded == [0, 2, 4]
+    assert [(index, chunk[0]["n"]) for index, chunk, _ in error.failed] == [(1, 10), (3, 30)]
+    assert all(isinstance(exc, requests.exceptions.HTTPError) for _, _, exc in error.failed)
+    assert [r["id"] for r in error.records] == \
+        ["rec{}".format(n) for n in itertools.chain(range(10), range(20, 30), range(40, 45))]
+    assert "2 of 5 chunks failed" in str(error)
+
+
+def test_get_iter_follows_offsets():
+    def pages(method, params, json_data):
+        offset = int(params.get("offset", 0))
+        data = {"records": [{"id": "rec{}".format(offset)}]}
+        if offset < 2:
+            data["offset"] = str(offset + 1)
+        return response(200, data)
+
+    table = airtable(pages)
+    assert [r["id"] for r in table.get_all(view="Grid")] == ["rec0", "rec1", "rec2"]
+    assert all(call[1]["view"] == "Grid" for call in table.session.calls)
+
+
+def test_get_iter_early_close_does_not_wait_for_the_fetcher():
+    release = threading.Event()
+
+    def slow_pages(method, params, json_data):
+        if params.get("offset"):
+            # e.g. a request stuck in limiter pauses and retries
+            release.wait(10)
+        return response(200, {"records": [{"id": "rec"}], "offset": "next"})
+
+    table = airtable(slow_pages)
+    pages = table.get_iter()
+    assert next(pages) == [{"id": "rec"}]
+    time.sleep(0.05)
+    assert timed_close(pages) < 0.5
+    release.set()
+
+
+def timed_close(generator):
+    start = time.monotonic()
+    generator.close()
+    return time.monotonic() - start
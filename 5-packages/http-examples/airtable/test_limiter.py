@@ -0,0 +1,55 @@
+import threading
+import time
+
+from .limiter import TokenBucket, bucket_for
+
+
+def timed(fn, *args):
+    start = time.monotonic()
+    fn(*args)
+    return time.monotonic() - start
+
+
+def test_burst_then_rate():
+    bucket = TokenBucket(rate=50, capacity=5)
+    assert timed(lambda: [bucket.acquire() for _ in range(5)]) < 0.05
+    # the burst is used up, ten more take ten intervals of 1/50 s
+    assert 0.18 <= timed(lambda: [bucket.acquire() for _ in range(10)]) < 0.4
+
+
+def test_threads_share_the_rate():
+    bucket = TokenBucket(rate=100, capacity=1)
+    bucket.acquire()
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(5)])
+               for _ in range(4)]
+    start = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # 20 tokens at 100 per second, whatever the number of threads
+    assert 0.18 <= time.monotonic() - start < 0.5
+
+
+def test_pause_holds_back_every_thread():
+    bucket = TokenBucket(rate=1000, capacity=10)
+    bucket.pause(0.2)
+    waits = []
+    threads = [threading.Thread(target=lambda: waits.append(timed(bucket.acquire)))
+               for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(waits) == 3 and min(waits) >= 0.19
+    # a shorter pause does not cut a running one short
+    bucket.pause(0.3)
+    bucket.pause(0.05)
+    assert timed(bucket.acquire) >= 0.29
+
+
+def test_bucket_for_shares_one_bucket_per_key():
+    first = bucket_for("appShared", 5)
+    assert bucket_for("appShared", 10) is first
+    assert first.rate == 5
+    assert bucket_for("appOther", 5) is not first
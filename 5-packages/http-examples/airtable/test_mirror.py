@@ -0,0 +1,85 @@
+from .mirror import AirtableMirror
+
+
+class FakeAirtable:
+    """Returns the next prepared list of records from get_iter, in pages
+    of two, and keeps the options of every call"""
+
+    def __init__(self):
+        self.responses = []
+        self.calls = []
+
+    def get_iter(self, **options):
+        self.calls.append(options)
+        records = self.responses.pop(0)
+        for start in range(0, len(records), 2):
+            yield records[start:start + 2]
+
+
+def record(record_id, **fields):
+    return {"id": record_id, "createdTime": "2020-01-01T00:00:00.000Z", "fields": fields}
+
+
+def ids(mirror):
+    return sorted(r["id"] for r in mirror.iter_records())
+
+
+def test_delta_is_combined_with_the_callers_formula():
+    airtable = FakeAirtable()
+    mirror = AirtableMirror(airtable, ":memory:")
+    airtable.responses = [[record("rec1", Status="open")], []]
+    assert mirror.sync(formula="{Status} = 'open'") == 1
+    assert airtable.calls[0] == {"formula": "{Status} = 'open'"}
+    mirror.sync(formula="{Status} = 'open'")
+    formula = airtable.calls[1]["formula"]
+    assert formula.startswith("AND({Status} = 'open', IS_AFTER(LAST_MODIFIED_TIME(), ")
+    assert mirror.lookup("Status", "open")["id"] == "rec1"
+
+
+def test_every_scope_has_its_own_last_sync():
+    airtable = FakeAirtable()
+    mirror = AirtableMirror(airtable, ":memory:")
+    airtable.responses = [[record("rec1")], [record("rec2")], []]
+    mirror.sync(view="Open")
+    assert mirror.last_sync is None
+    # a first sync of another scope pulls all of it, not the delta of the first
+    mirror.sync(view="Closed")
+    assert airtable.calls[1] == {"view": "Closed"}
+    mirror.sync()
+    assert airtable.calls[2] == {}
+    assert mirror.last_sync is not None
+    assert ids(mirror) == ["rec1", "rec2"]
+
+
+def test_full_sync_only_drops_records_of_its_scope():
+    airtable = FakeAirtable()
+    mirror = AirtableMirror(airtable, ":memory:")
+    open_, closed = "{Status} = 'open'", "{Status} = 'closed'"
+    airtable.responses = [
+        [record("rec1"), record("rec2"), record("rec3")],
+        [record("rec4")],
+    ]
+    mirror.sync(formula=open_)
+    # another filter does not see rec1-3, they must not be deleted
+    mirror.sync(full=True, formula=closed)
+    assert ids(mirror) == ["rec1", "rec2", "rec3", "rec4"]
+
+    # rec3 no longer matches the filter it was synced with
+    airtable.responses = [[record("rec1"), record("rec2")]]
+    mirror.sync(full=True, formula=open_)
+    assert ids(mirror) == ["rec1", "rec2", "rec4"]
+
+    # an unfiltered full sync sees the whole table
+    airtable.responses = [[record("rec1"), record("rec4")]]
+    mirror.sync(full=True)
+    assert ids(mirror) == ["rec1", "rec4"]
+
+
+def test_records_held_by_another_scope_stay():
+    airtable = FakeAirtable()
+    mirror = AirtableMirror(airtable, ":memory:")
+    airtable.responses = [[record("rec1")], [record("rec1")], []]
+    mirror.sync(view="Open")
+    mirror.sync(view="Mine")
+    mirror.sync(full=True, view="Open")
+    assert ids(mirror) == ["rec1"]
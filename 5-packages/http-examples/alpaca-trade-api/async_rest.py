@@ -0,0 +1,263 @@
+# asyncio version of REST
+# same request methods as REST, but on one pooled aiohttp session so many
+# calls can be in flight at once, plus helpers that fan a query out per
+# symbol or per time window under a shared rate limit
+import asyncio
+import logging
+import time
+
+import aiohttp
+
+from .common import (
+    get_base_url,
+    get_credentials,
+    get_api_version,
+    json_loads,
+    parse_error,
+    APIError,
+    RetryException,
+)
+from .entity import Order
+from .retry import RetryPolicy, RateTracker
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRateLimiter(object):
+    """Token bucket for coroutines: rate calls per second, bursts up to burst"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = None
+
+    async def acquire(self):
+        if self._lock is None:
+            # created lazily so it belongs to the running loop
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def time_windows(start, end, step):
+    """Split [start, end) into (after, until) pairs of length step, e.g. to
+    page through order history with one request per window"""
+    windows = []
+    while start < end:
+        until = min(start + step, end)
+        windows.append((start, until))
+        start = until
+    return windows
+
+
+class AsyncREST(object):
+    def __init__(
+        self,
+        key_id=None,
+        secret_key=None,
+        base_url=None,
+        api_version=None,
+        oauth=None,
+        max_connections=20,
+        rate_limit=200 / 60,  # the trading API allows 200 requests per minute
+        retry_policy=None,
+    ):
+        self._key_id, self._secret_key, self._oauth = get_credentials(
+            key_id, secret_key, oauth)
+        self._base_url = base_url or get_base_url()
+        self._api_version = get_api_version(api_version)
+        self._max_connections = max_connections
+        self._limiter = AsyncRateLimiter(rate_limit)
+        self._session = None
+        # the same retry and rate limit handling as REST
+        self._retry_policy = retry_policy or RetryPolicy.from_env()
+        self._rate_tracker = RateTracker()
+
+    def _headers(self):
+        headers = {}
+        if self._oauth:
+            headers['Authorization'] = 'Bearer ' + self._oauth
+        else:
+            headers['APCA-API-KEY-ID'] = self._key_id
+            headers['APCA-API-SECRET-KEY'] = self._secret_key
+        return headers
+
+    def _get_session(self):
+        # one session for every call, its connector keeps connections alive
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._max_connections),
+                headers=self._headers(),
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _request(self, method, path, data=None, base_url=None, api_version=None):
+        base_url = base_url or self._base_url
+        version = api_version if api_version else self._api_version
+        url = base_url + '/' + version + path
+        opts = {'allow_redirects': False}
+        if method.upper() == 'GET':
+            opts['params'] = data
+        else:
+            opts['json'] = data
+
+        policy = self._retry_policy
+        attempt = 0
+        while True:
+            wait = self._rate_tracker.next_wait()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            try:
+                return await self._one_request(
+                    method, url, opts, policy.can_retry(path, attempt))
+            except RetryException as exc:
+                retry_wait = policy.delay(attempt, exc.response)
+                policy.record_retry(path)
+                attempt += 1
+                logger.warning(
+                    'sleep {:.2f} seconds and retrying {} '
+                    '(attempt {})...'.format(retry_wait, url, attempt))
+                await asyncio.sleep(retry_wait)
+
+    async def _one_request(self, method, url, opts, retry):
+        """Same contract as REST._one_request"""
+        await self._limiter.acquire()
+        async with self._get_session().request(method, url, **opts) as resp:
+            self._rate_tracker.update(resp.headers)
+            body = await resp.read()
+            if resp.status >= 400:
+                if (resp.status in self._retry_policy.retry_codes and retry
+                        and self._retry_policy.can_wait(resp)):
+                    raise RetryException(resp)
+                error = parse_error(body)
+                if error is not None:
+                    raise APIError(error)
+                resp.raise_for_status()
+            if body:
+                return json_loads(body)
+            return None
+
+    async def get(self, path, data=None):
+        return await self._request('GET', path, data)
+
+    async def post(self, path, data=None):
+        return await self._request('POST', path, data)
+
+    async def patch(self, path, data=None):
+        return await self._request('PATCH', path, data)
+
+    async def delete(self, path, data=None):
+        return await self._request('DELETE', path, data)
+
+    async def list_orders(self, status=None, limit=None, after=None, until=None,
+                          direction=None, params=None):
+        """
+        Get a list of orders
+        """
+        if params is None:
+            params = dict()
+        if limit is not None:
+            params['limit'] = limit
+        if after is not None:
+            params['after'] = after
+        if until is not None:
+            params['until'] = until
+        if direction is not None:
+            params['direction'] = direction
+        if status is not None:
+            params['status'] = status
+        resp = await self.get('/orders', params)
+        return Order.from_list(resp)
+
+    async def submit_order(self, symbol, qty, side, type, time_in_force,
+                           limit_price=None, stop_price=None, client_order_id=None,
+                           extended_hours=None):
+        '''Request a new order'''
+        params = {
+            'symbol': symbol,
+            'qty': qty,
+            'side': side,
+            'type': type,
+            'time_in_force': time_in_force,
+        }
+        if limit_price is not None:
+            params['limit_price'] = limit_price
+        if stop_price is not None:
+            params['stop_price'] = stop_price
+        if client_order_id is not None:
+            params['client_order_id'] = client_order_id
+        if extended_hours is not None:
+            params['extended_hours'] = extended_hours
+        resp = await self.post('/orders', params)
+        return Order(resp)
+
+    # concurrent helpers
+    # every call still goes through _request, so the rate limit holds no
+    # matter how many are started at once
+
+    async def map_symbols(self, fn, symbols):
+        """Run the coroutine function fn(symbol) for every symbol concurrently,
+        returns {symbol: result or the exception it raised}"""
+        symbols = list(symbols)
+        results = await asyncio.gather(*[fn(symbol) for symbol in symbols],
+                                       return_exceptions=True)
+        return dict(zip(symbols, results))
+
+    async def list_orders_windows(self, windows, status='all', limit=500, **kwargs):
+        """List orders for every (after, until) window concurrently, e.g. from
+        time_windows(), and return them merged without duplicates"""
+        pages = await asyncio.gather(*[
+            self._list_orders_window(after, until, status=status, limit=limit, **kwargs)
+            for after, until in windows
+        ])
+        orders = {}
+        for page in pages:
+            for order in page:
+                orders[order.id] = order
+        return list(orders.values())
+
+    async def _list_orders_window(self, after, until, limit, **kwargs):
+        """Every order of one window; a full page means there may be more, so
+        ask again for the orders submitted before the oldest one received"""
+        kwargs['direction'] = 'desc'
+        orders = []
+        while True:
+            page = await self.list_orders(limit=limit, after=after, until=until, **kwargs)
+            orders.extend(page)
+            if len(page) < limit:
+                return orders
+            oldest = page[-1]._raw['submitted_at']
+            if oldest == until:
+                # a whole page submitted at the same instant, until cannot
+                # move past it
+                logger.warning(
+                    'more than {} orders submitted at {}, '
+                    'some of them are missing'.format(limit, until))
+                return orders
+            until = oldest
+
+    async def submit_orders(self, orders):
+        """Submit a list of submit_order keyword dicts concurrently, returns
+        the Order or the exception raised for each, in input order"""
+        return await asyncio.gather(*[self.submit_order(**order) for order in orders],
+                                    return_exceptions=True)
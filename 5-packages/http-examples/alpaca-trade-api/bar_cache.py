@@ -0,0 +1,150 @@
+# on-disk cache of historical bars
+# every symbol and timeframe gets a directory with one .npy file per bar
+# field plus coverage.json, the list of [start, end) epoch second ranges
+# already fetched. Reads load the columns with mmap_mode='r' and slice them,
+# so no JSON is parsed and only the pages touched are read from disk. Only
+# the parts of a requested range that are not covered yet go to the API.
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from .entity import BAR_FIELDS, BAR_DTYPES, NY, Bars, BarSet
+
+# the bars endpoint returns at most this many bars per symbol and request
+PAGE_LIMIT = 1000
+
+
+def to_epoch(value):
+    """Epoch seconds of a timestamp, string or number; naive times are New York time"""
+    if isinstance(value, (int, float, np.integer)):
+        return int(value)
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize(NY)
+    return int(ts.timestamp())
+
+
+def merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def missing_ranges(start, end, covered):
+    """Parts of [start, end) not in the sorted, merged covered ranges"""
+    gaps = []
+    for c_start, c_end in covered:
+        if c_end <= start:
+            continue
+        if c_start >= end:
+            break
+        if c_start > start:
+            gaps.append((start, c_start))
+        start = max(start, c_end)
+    if start < end:
+        gaps.append((start, end))
+    return gaps
+
+
+class BarCache(object):
+    def __init__(self, api, cache_dir):
+        self.api = api
+        self.cache_dir = cache_dir
+
+    def _dir(self, symbol, timeframe):
+        return os.path.join(self.cache_dir, timeframe, symbol)
+
+    def coverage(self, symbol, timeframe):
+        path = os.path.join(self._dir(symbol, timeframe), 'coverage.json')
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def load_columns(self, symbol, timeframe):
+        directory = self._dir(symbol, timeframe)
+        try:
+            return {
+                field: np.load(os.path.join(directory, field + '.npy'), mmap_mode='r')
+                for field in BAR_FIELDS
+            }
+        except FileNotFoundError:
+            return {field: np.empty(0, dtype=BAR_DTYPES[field]) for field in BAR_FIELDS}
+
+    def _write(self, symbol, timeframe, columns, coverage):
+        directory = self._dir(symbol, timeframe)
+        os.makedirs(directory, exist_ok=True)
+        # write next to the target and rename, readers holding an mmap of the
+        # old file keep a valid view; coverage goes last so it never claims
+        # bars that are not on disk yet
+        for field in BAR_FIELDS:
+            tmp = os.path.join(directory, field + '.npy.tmp')
+            with open(tmp, 'wb') as f:
+                np.save(f, columns[field])
+            os.replace(tmp, os.path.join(directory, field + '.npy'))
+        tmp = os.path.join(directory, 'coverage.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(coverage, f)
+        os.replace(tmp, os.path.join(directory, 'coverage.json'))
+
+    def _fetch(self, symbol, timeframe, start, end):
+        """All bars of [start, end) from the API, page by page"""
+        pages = []
+        while start < end:
+            bars = self.api.get_barset(
+                symbol, timeframe, limit=PAGE_LIMIT,
+                start=pd.Timestamp(start, unit='s', tz=NY).isoformat(),
+                end=pd.Timestamp(end, unit='s', tz=NY).isoformat(),
+            ).get(symbol)
+            if bars is None or len(bars) == 0:
+                break
+            pages.append(bars.columns)
+            if len(bars) < PAGE_LIMIT:
+                break
+            start = int(bars.columns['t'][-1]) + 1
+        return pages
+
+    def fill(self, symbol, timeframe, start, end):
+        """Fetch the parts of [start, end) that are not cached yet"""
+        start, end = to_epoch(start), to_epoch(end)
+        # never mark the future as covered, those bars do not exist yet
+        end = min(end, int(time.time()))
+        coverage = self.coverage(symbol, timeframe)
+        gaps = missing_ranges(start, end, coverage)
+        if not gaps:
+            return
+        pages = []
+        for gap_start, gap_end in gaps:
+            pages.extend(self._fetch(symbol, timeframe, gap_start, gap_end))
+        columns = self.load_columns(symbol, timeframe)
+        if pages:
+            t = np.concatenate([columns['t']] + [page['t'] for page in pages])
+            # keep the first copy of every timestamp, in time order
+            t, keep = np.unique(t, return_index=True)
+            columns = {
+                field: np.concatenate([columns[field]] + [page[field] for page in pages])[keep]
+                for field in BAR_FIELDS
+            }
+        self._write(symbol, timeframe, columns,
+                    merge_ranges(coverage + [list(gap) for gap in gaps]))
+
+    def get_bars(self, symbol, timeframe, start, end):
+        """Bars of [start, end), read from the cache after filling any gaps"""
+        self.fill(symbol, timeframe, start, end)
+        columns = self.load_columns(symbol, timeframe)
+        lo, hi = np.searchsorted(columns['t'], [to_epoch(start), to_epoch(end)])
+        return Bars.from_columns({field: col[lo:hi] for field, col in columns.items()})
+
+    def get_barset(self, symbols, timeframe, start, end):
+        barset = BarSet({})
+        for symbol in symbols:
+            barset[symbol] = self.get_bars(symbol, timeframe, start, end)
+        return barset
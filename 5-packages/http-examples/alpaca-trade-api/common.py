@@ -1,5 +1,47 @@
+import json
 import os
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class RetryException(Exception):
+    def __init__(self, response=None):
+        super().__init__()
+        self.response = response
+
+
+class APIError(Exception):
+    """Represents API related error
+    error.status_code will have status code
+    """
+    def __init__(self, error, http_error=None):
+        super().__init__(error['message'])
+        self._error = error
+        self._http_error = http_error
+
+    @property
+    def code(self):
+        return self._error['code']
+
+    @property
+    def status_code(self):
+        http_error = self._http_error
+        if http_error is not None and hasattr(http_error, 'response'):
+            return http_error.response.status_code
+
+    @property
+    def request(self):
+        if self._http_error is not None:
+            return self._http_error.request
+
+    @property
+    def response(self):
+        if self._http_error is not None:
+            return self._http_error.response
+
 
 def get_base_url():
     return os.environ.get(
@@ -44,4 +86,25 @@ def get_api_version(api_version):
     if api_version is None:
         api_version = 'v2'
 
-    return api_version
\ No newline at end of file
+    return api_version
+
+
+def json_loads(body):
+    '''Decode a response body (bytes) in one pass, with orjson when installed'''
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def parse_error(body):
+    '''The API's error object in an error response body, or None if the body
+    is not one, e.g. an HTML page from a proxy or a truncated body'''
+    if b'code' not in body:
+        return None
+    try:
+        error = json_loads(body)
+    except ValueError:
+        return None
+    if isinstance(error, dict) and 'code' in error:
+        return error
+    return None
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the package directory is not a valid identifier, so the tests import its
+# modules with importlib.import_module('alpaca-trade-api.<module>') from the
+# parent directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -1,31 +1,72 @@
+import keyword
+import numpy as np
 import pandas as pd
 import pprint
 import re
+from collections.abc import Sequence
 
 ISO8601YMD = re.compile(r'\d{4}-\d{2}-\d{2}T')
 NY = 'America/New_York'
 
 
+TIMESTAMP_SUFFIXES = ('_at', '_timestamp', '_time')
+
+
+def iso_timestamp(val):
+    if isinstance(val, str) and ISO8601YMD.match(val):
+        return pd.Timestamp(val)
+    return val
+
+
 class Entity(object):
     '''This helper class provides property access (the "dot notation")
     to the json object, backed by the original object stored in the _raw
     field.
+
+    How a field is converted is worked out once per class and field name,
+    and converted values are cached per instance, so reading a timestamp
+    again does not parse it again.
     '''
+    __slots__ = ('_raw', '_cache')
+
+    # field name -> converter, subclasses add fields that need special handling
+    field_converters = {}
 
     def __init__(self, raw):
         self._raw = raw
+        # created on the first converted read, most entities of a large
+        # list response are never read at all
+        self._cache = None
+
+    @classmethod
+    def _converter(cls, key):
+        converters = cls.__dict__.get('_converters')
+        if converters is None:
+            converters = {}
+            # a separate dict per class, subclasses convert differently
+            setattr(cls, '_converters', converters)
+        if key not in converters:
+            converter = cls.field_converters.get(key)
+            if converter is None and key.endswith(TIMESTAMP_SUFFIXES):
+                converter = iso_timestamp
+            converters[key] = converter
+        return converters[key]
 
     def __getattr__(self, key):
+        if key in Entity.__slots__:
+            # not set yet, e.g. while unpickling
+            raise AttributeError(key)
+        cache = self._cache
+        if cache is not None and key in cache:
+            return cache[key]
         if key in self._raw:
             val = self._raw[key]
-            if (isinstance(val, str) and
-                    (key.endswith('_at') or
-                     key.endswith('_timestamp') or
-                     key.endswith('_time')) and
-                    ISO8601YMD.match(val)):
-                return pd.Timestamp(val)
-            else:
-                return val
+            converter = self._converter(key)
+            if converter is not None:
+                if cache is None:
+                    cache = self._cache = {}
+                val = cache[key] = converter(val)
+            return val
         return super().__getattribute__(key)
 
     def __repr__(self):
@@ -34,69 +75,208 @@ class Entity(object):
             raw=pprint.pformat(self._raw, indent=4),
         )
 
+    @classmethod
+    def from_list(cls, raws):
+        '''Map a decoded list response to typed records in one pass.
+
+        Every field the response has becomes a slot of a record class made
+        for this entity and set of fields, and the values are converted per
+        field for the whole list at once, e.g. all timestamps of a column
+        in one parse. Reading a field is then a plain slot read.
+        '''
+        if not raws:
+            return []
+        fields = tuple(dict.fromkeys(key for raw in raws for key in raw))
+        record = cls._record_type(fields)
+        slots = record.__slots__
+        missing = object()
+        columns = []
+        for field in slots:
+            values = [raw.get(field, missing) for raw in raws]
+            converter = cls._converter(field)
+            if converter is iso_timestamp:
+                values = iso_timestamp_column(values)
+            elif converter is not None:
+                values = [val if val is missing else converter(val) for val in values]
+            columns.append(values)
+        setters = [getattr(record, field).__set__ for field in slots]
+        new = object.__new__
+        records = []
+        for raw, values in zip(raws, zip(*columns)):
+            entity = new(record)
+            entity._raw = raw
+            entity._cache = None
+            for setter, val in zip(setters, values):
+                if val is not missing:
+                    setter(entity, val)
+            records.append(entity)
+        return records
+
+    @classmethod
+    def _record_type(cls, fields):
+        record_types = cls.__dict__.get('_record_types')
+        if record_types is None:
+            record_types = {}
+            setattr(cls, '_record_types', record_types)
+        record = record_types.get(fields)
+        if record is None:
+            # fields that cannot be a slot stay readable through _raw
+            slots = tuple(
+                field for field in fields
+                if field.isidentifier() and not keyword.iskeyword(field)
+                and not hasattr(cls, field)
+            )
+            record = type(cls.__name__, (cls,), {
+                '__slots__': slots,
+                '__qualname__': cls.__qualname__,
+                '__module__': cls.__module__,
+                # pickles as the plain entity, the record class is made at runtime
+                '__reduce__': lambda self: (cls, (self._raw,)),
+            })
+            record_types[fields] = record
+        return record
+
+
+def iso_timestamp_column(values):
+    '''iso_timestamp for a whole column, the strings are parsed together'''
+    index = [i for i, val in enumerate(values)
+             if isinstance(val, str) and ISO8601YMD.match(val)]
+    if not index:
+        return values
+    try:
+        parsed = pd.to_datetime([values[i] for i in index], format='ISO8601')
+    except (ValueError, TypeError):
+        # e.g. mixed UTC offsets, which do not fit one column
+        parsed = [pd.Timestamp(values[i]) for i in index]
+    values = list(values)
+    for i, ts in zip(index, parsed):
+        values[i] = ts
+    return values
+
 
 class Account(Entity):
-    pass
+    __slots__ = ()
 
 
 class AccountConfigurations(Entity):
-    pass
+    __slots__ = ()
 
 
 class Asset(Entity):
-    pass
+    __slots__ = ()
 
 
 class Order(Entity):
-    pass
+    __slots__ = ()
 
 
 class Position(Entity):
-    pass
+    __slots__ = ()
 
 
 class AccountActivity(Entity):
-    pass
+    __slots__ = ()
 
 
 class Bar(Entity):
-    def __getattr__(self, key):
-        if key == 't':
-            val = self._raw[key[0]]
-            return pd.Timestamp(val, unit='s', tz=NY)
-        return super().__getattr__(key)
+    __slots__ = ()
+    field_converters = {
+        't': lambda val: pd.Timestamp(val, unit='s', tz=NY),
+    }
+
+
+# bars are kept as one numpy array per field instead of a Bar per row,
+# Bar objects are only created when a single bar is indexed
+BAR_FIELDS = ('t', 'o', 'h', 'l', 'c', 'v')
+# only used for empty columns, otherwise the dtype follows the data the way
+# pd.DataFrame(raw) infers it, so a fractional volume is not cut to an int
+BAR_DTYPES = {
+    't': np.int64,
+    'o': np.float64,
+    'h': np.float64,
+    'l': np.float64,
+    'c': np.float64,
+    'v': np.int64,
+}
+BAR_ALIAS = {
+    't': 'time',
+    'o': 'open',
+    'h': 'high',
+    'l': 'low',
+    'c': 'close',
+    'v': 'volume',
+}
+
+
+def python_value(val):
+    # numpy scalars of the numeric columns, objects come back as they are
+    return val.item() if isinstance(val, np.generic) else val
+
+
+def bar_column(values, field):
+    if not values:
+        return np.empty(0, dtype=BAR_DTYPES.get(field, np.float64))
+    column = np.asarray(values)
+    if column.dtype.kind in 'iuf':
+        return column
+    if all(val is None or isinstance(val, (int, float, np.number)) and not isinstance(val, bool)
+           for val in values):
+        # missing values (None) become NaN, as they would in a DataFrame
+        return np.asarray(values, dtype=np.float64)
+    # strings and mixed values stay as they are, an object column
+    return np.asarray(values, dtype=object)
 
 
-class Bars(list):
+class Bars(Sequence):
+    '''Bars of one symbol, stored column by column.
+    Fields besides t/o/h/l/c/v that the API sends are kept as extra columns,
+    so indexing returns a Bar with every field of the raw bar.
+    '''
+
     def __init__(self, raw):
-        super().__init__([Bar(o) for o in raw])
-        self._raw = raw
+        # every field seen in any bar, the standard ones first
+        fields = dict.fromkeys(BAR_FIELDS)
+        for bar in raw:
+            fields.update(dict.fromkeys(bar))
+        self._columns = {
+            field: bar_column([bar.get(field) for bar in raw], field)
+            for field in fields
+        }
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Build Bars straight from {field: array}, the arrays are not copied"""
+        bars = cls.__new__(cls)
+        bars._columns = {field: np.asarray(col) for field, col in columns.items()}
+        return bars
+
+    @property
+    def columns(self):
+        return self._columns
+
+    def __len__(self):
+        return len(self._columns['t'])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return Bars.from_columns(
+                {field: col[index] for field, col in self._columns.items()})
+        return Bar({field: python_value(col[index]) for field, col in self._columns.items()})
+
+    def __repr__(self):
+        return '{name}({size} bars)'.format(name=self.__class__.__name__, size=len(self))
 
     @property
     def df(self):
         if not hasattr(self, '_df'):
-            df = pd.DataFrame(
-                self._raw, columns=('t', 'o', 'h', 'l', 'c', 'v'),
+            index = pd.to_datetime(
+                self._columns['t'], unit='s', utc=True).as_unit('ns').tz_convert(NY)
+            index.name = 'time'
+            # copy=False keeps every column a view of the arrays above
+            self._df = pd.DataFrame(
+                {BAR_ALIAS[field]: self._columns[field] for field in BAR_FIELDS[1:]},
+                index=index, copy=False,
             )
-            alias = {
-                't': 'time',
-                'o': 'open',
-                'h': 'high',
-                'l': 'low',
-                'c': 'close',
-                'v': 'volume',
-            }
-            df.columns = [alias[c] for c in df.columns]
-            df.set_index('time', inplace=True)
-            if not df.empty:
-                df.index = pd.to_datetime(
-                    (df.index * 1e9).astype('int64'), utc=True,
-                ).tz_convert(NY)
-            else:
-                df.index = pd.to_datetime(
-                    df.index, utc=True
-                )
-            self._df = df
         return self._df
 
 
@@ -104,44 +284,33 @@ class BarSet(dict):
     def __init__(self, raw):
         for symbol in raw:
             self[symbol] = Bars(raw[symbol])
-        self._raw = raw
 
     @property
     def df(self):
         '''## Experimental '''
         if not hasattr(self, '_df'):
-            dfs = []
-            for symbol, bars in self.items():
-                df = bars.df.copy()
-                df.columns = pd.MultiIndex.from_product(
-                    [[symbol, ], df.columns])
-                dfs.append(df)
-            if len(dfs) == 0:
+            if len(self) == 0:
                 self._df = pd.DataFrame()
             else:
-                self._df = pd.concat(dfs, axis=1)
+                # the dict keys become the outer column level, so the per
+                # symbol frames are not copied just to relabel their columns
+                self._df = pd.concat({symbol: bars.df for symbol, bars in self.items()}, axis=1)
         return self._df
 
 
 class Clock(Entity):
-    def __getattr__(self, key):
-        if key in self._raw:
-            val = self._raw[key]
-            if key in ('timestamp', 'next_open', 'next_close'):
-                return pd.Timestamp(val)
-            else:
-                return val
-        return super().__getattr__(key)
+    __slots__ = ()
+    field_converters = {
+        'timestamp': pd.Timestamp,
+        'next_open': pd.Timestamp,
+        'next_close': pd.Timestamp,
+    }
 
 
 class Calendar(Entity):
-    def __getattr__(self, key):
-        if key in self._raw:
-            val = self._raw[key]
-            if key in ('date',):
-                return pd.Timestamp(val)
-            elif key in ('open', 'close'):
-                return pd.Timestamp(val).time()
-            else:
-                return val
-        return super().__getattr__(key)
\ No newline at end of file
+    __slots__ = ()
+    field_converters = {
+        'date': pd.Timestamp,
+        'open': lambda val: pd.Timestamp(val).time(),
+        'close': lambda val: pd.Timestamp(val).time(),
+    }
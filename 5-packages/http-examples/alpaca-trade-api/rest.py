@@ -1,5 +1,4 @@
 import logging 
-import os 
 import requests 
 from requests.exceptions import HTTPError
 import time 
@@ -8,49 +7,25 @@ from .common import (
     get_data_url,
     get_credentials,
     get_api_version,
+    json_loads,
+    parse_error,
+    APIError,
+    RetryException,
 )
 
+from .retry import RetryPolicy, RateTracker
 from .entity import (
     Account, AccountConfigurations, AccountActivity,
     Asset, Order, Position, BarSet, Clock, Calendar,
 )
-from . import polygon
+try:
+    from . import polygon
+except ImportError:
+    # the polygon client is not part of this port, REST works without it
+    polygon = None
 
 logger = logging.getLogger(__name__)
 
-class RetryException(Exception):
-    pass 
-
-class APIError(Exception):
-    """Represents API related error
-    error.status_code will have status code 
-    """
-    def __init__(self, error, http_error=None):
-        super().__init__(error['message'])
-        self._error = error 
-        self._http_error = http_error
-
-    @property 
-    def code(self):
-        return self._error['code']
-    
-    @property 
-    def status_code(self):
-        http_error = self._http_error
-        if http_error is not None and hasattr(http_error, 'response'):
-            return http_error.response.status_code
-    
-    @property 
-    def request(self):
-        if self._http_error is not None:
-            return self._http_error.request 
-    
-    @property 
-    def response(self):
-        if self._http_error is not None:
-            return self._http_error.response 
-    
-
 class REST(object):
     def __init__(
         self,
@@ -58,7 +33,8 @@ class REST(object):
         secret_key = None,
         base_url = None,
         api_version = None,
-        oauth = None
+        oauth = None,
+        retry_policy = None
     ):
         # move the get credentials to the common (utils) which lookup env variables
         self._key_id, self._secret_key, self._oauth = get_credentials(
@@ -67,12 +43,12 @@ class REST(object):
         self._base_url = base_url or get_base_url()
         self._api_version = get_api_version(api_version)
         self._session = requests.Session()
-        self._retry = int(os.environ.get('APCA_RETRY_MAX', 3))
-        self._retry_wait = int(os.environ.get('APCA_RETRY_WAIT', 3))
-        self._retry_codes = [int(o)for o in os.environ.get(
-            'APCA_RETRY_CODES', '429,504').split(',')]
-        self.polygon = polygon.REST(
-            self._key_id, 'staging' in self._base_url)
+        self._retry_policy = retry_policy or RetryPolicy.from_env()
+        self._rate_tracker = RateTracker()
+        self.polygon = None
+        if polygon is not None:
+            self.polygon = polygon.REST(
+                self._key_id, 'staging' in self._base_url)
     
     def _request(
         self, 
@@ -89,12 +65,12 @@ class REST(object):
         # initialize headers
         headers = {}
         if self._oauth:
-            headers['Authorization'] = 'Bearer '+self.oauth 
+            headers['Authorization'] = 'Bearer ' + self._oauth
         else:
             headers['APCA-API-KEY-ID'] = self._key_id
             headers['APCA-API-SECRET-KEY'] = self._secret_key
         opts = {
-            'headers': headers
+            'headers': headers,
             'allow_redirects': False
         }
 
@@ -109,48 +85,51 @@ class REST(object):
             opts['json'] = data 
         
         # retry functionality
-        # basically do a loop and call _one_request every time 
-        retry = self._retry
-        if retry < 0:
-            retry = 0
-        while retry >= 0:
-            try: 
+        # basically do a loop and call _one_request every time, the policy
+        # decides how often and how long to wait in between
+        policy = self._retry_policy
+        attempt = 0
+        while True:
+            self._rate_tracker.throttle()
+            try:
                 # the one_request will raise RetryException in the case of response status code 429
-                return self._one_request(method, url, opts, retry)
-            except RetryException:
-                retry_wait = self._retry_wait
+                return self._one_request(
+                    method, url, opts, policy.can_retry(path, attempt))
+            except RetryException as exc:
+                retry_wait = policy.delay(attempt, exc.response)
+                policy.record_retry(path)
+                attempt += 1
                 logger.warning(
-                    'sleep {} seconds and retrying {} '
-                    '{} more time(s)...'.format(
-                        retry_wait, url, retry))
+                    'sleep {:.2f} seconds and retrying {} '
+                    '(attempt {})...'.format(retry_wait, url, attempt))
                 time.sleep(retry_wait)
-                retry -= 1
-                continue 
 
     # request just needs the url, method, and the headers, etc. are in the opts kwargs
     def _one_request(self, method, url, opts, retry):
         """
         Perform one request, possibly raising RetryException in the case
-        the response is 429. Otherwise, if error text contain "code" string,
-        then it decodes to json object and returns APIError.
+        the response is 429. Otherwise, if the error body is a json object
+        with a "code", it raises APIError, else the HTTPError.
         Returns the body json in the 200 status.
+        The body is read as bytes and decoded once, never as text.
         """
-        retry_codes = self._retry_codes
+        retry_codes = self._retry_policy.retry_codes
         resp = self._session.request(method, url, **opts)
+        self._rate_tracker.update(resp.headers)
+        body = resp.content
         try:
             resp.raise_for_status()
         except HTTPError as http_error:
             # retry if hit limit 
-            if resp.status_code in retry_codes and retry >0:
-                raise RetryException()
-            if 'code' in resp.text:
-                error = resp.json()
-                if 'code' in error:
-                    raise APIError(error, http_error)
-            else:
-                raise 
-        if resp.text != '':
-            return resp.json() # returns a dictionary 
+            if (resp.status_code in retry_codes and retry
+                    and self._retry_policy.can_wait(resp)):
+                raise RetryException(resp)
+            error = parse_error(body)
+            if error is not None:
+                raise APIError(error, http_error)
+            raise
+        if body:
+            return json_loads(body) # returns a dictionary 
         return None 
     
     # now define other methods to wrap around the self._request
@@ -165,6 +144,15 @@ class REST(object):
 
     def delete(self, path, data=None):
         return self._request('DELETE', path, data)
+
+    def data_get(self, path, data=None):
+        # market data is served from its own host and api version
+        base_url = get_data_url()
+        return self._request(
+            'GET', path, data,
+            base_url=base_url,
+            api_version='v1'
+        )
     
     def list_orders(self, status=None, limit=None, after=None, until=None,
                     direction=None, params=None):
@@ -184,7 +172,7 @@ class REST(object):
         if status is not None:
             params['status'] = status
         resp = self.get('/orders', params)
-        return [Order(o) for o in resp]
+        return Order.from_list(resp)
     
     def submit_order(self, symbol, qty, side, type, time_in_force,
                      limit_price=None, stop_price=None, client_order_id=None,
@@ -207,5 +195,28 @@ class REST(object):
             params['extended_hours'] = extended_hours
         resp = self.post('/orders', params)
         return Order(resp)
-    
-    
\ No newline at end of file
+
+    def get_barset(self, symbols, timeframe, limit=None, start=None,
+                   end=None, after=None, until=None):
+        '''Get BarSet(dict[str]->list[Bar])
+        The parameter symbols can be either a comma-split string
+        or a list of string. Each symbol becomes the key of
+        the returned value.
+        '''
+        if not isinstance(symbols, str):
+            symbols = ','.join(symbols)
+        params = {
+            'symbols': symbols,
+        }
+        if limit is not None:
+            params['limit'] = limit
+        if start is not None:
+            params['start'] = start
+        if end is not None:
+            params['end'] = end
+        if after is not None:
+            params['after'] = after
+        if until is not None:
+            params['until'] = until
+        resp = self.data_get('/bars/{}'.format(timeframe), params)
+        return BarSet(resp)
@@ -0,0 +1,142 @@
+import collections
+import os
+import random
+import threading
+import time
+
+
+class RetryPolicy(object):
+    """Decides whether a failed request is retried and how long to wait.
+
+    Waits grow exponentially with full jitter, so workers throttled at the
+    same moment do not all retry at the same moment. A Retry-After header
+    from the server wins over the computed wait and is waited out in full;
+    if it asks for more than max_retry_after seconds the request is not
+    retried but fails right away. endpoint_budgets caps the
+    retries per endpoint path within budget_window seconds, e.g.
+    {'/orders': 10}, so one failing endpoint cannot keep every worker busy
+    retrying.
+    """
+
+    def __init__(self, max_retries=3, base_delay=1.0, max_delay=30.0,
+                 retry_codes=(429, 504), endpoint_budgets=None, budget_window=60.0,
+                 max_retry_after=None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # None waits for whatever Retry-After asks
+        self.max_retry_after = max_retry_after
+        self.retry_codes = tuple(retry_codes)
+        self.endpoint_budgets = endpoint_budgets or {}
+        self.budget_window = budget_window
+        self._retries = collections.defaultdict(collections.deque)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Policy from the APCA_RETRY_* variables REST has always read,
+        APCA_RETRY_WAIT is now the base of the backoff"""
+        kwargs.setdefault('max_retries', max(int(os.environ.get('APCA_RETRY_MAX', 3)), 0))
+        kwargs.setdefault('base_delay', float(os.environ.get('APCA_RETRY_WAIT', 1)))
+        kwargs.setdefault('retry_codes', [int(o) for o in os.environ.get(
+            'APCA_RETRY_CODES', '429,504').split(',')])
+        return cls(**kwargs)
+
+    def _budget(self, endpoint):
+        for prefix, budget in self.endpoint_budgets.items():
+            if endpoint.startswith(prefix):
+                return prefix, budget
+        return None, None
+
+    def can_retry(self, endpoint, attempt):
+        if attempt >= self.max_retries:
+            return False
+        prefix, budget = self._budget(endpoint)
+        if budget is None:
+            return True
+        with self._lock:
+            retries = self._retries[prefix]
+            cutoff = time.monotonic() - self.budget_window
+            while retries and retries[0] < cutoff:
+                retries.popleft()
+            return len(retries) < budget
+
+    def record_retry(self, endpoint):
+        prefix, budget = self._budget(endpoint)
+        if budget is not None:
+            with self._lock:
+                self._retries[prefix].append(time.monotonic())
+
+    @staticmethod
+    def retry_after(response):
+        """Seconds the response asks to wait in Retry-After, or None"""
+        if response is None:
+            return None
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is None:
+            return None
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            # the HTTP-date form is not used by the API
+            return None
+
+    def can_wait(self, response):
+        """False if the server asks for a longer wait than max_retry_after"""
+        retry_after = self.retry_after(response)
+        return (retry_after is None or self.max_retry_after is None
+                or retry_after <= self.max_retry_after)
+
+    def delay(self, attempt, response=None):
+        retry_after = self.retry_after(response)
+        if retry_after is not None:
+            # retrying any earlier only earns another 429
+            return retry_after
+        # full jitter: anywhere between 0 and the exponential cap
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+class RateTracker(object):
+    """Follows the X-RateLimit-* headers of the responses and slows requests
+    down before the limit is used up, instead of waiting for a 429."""
+
+    def __init__(self, reserve=10):
+        # start spreading requests out once fewer than reserve are left
+        self.reserve = reserve
+        self.remaining = None
+        self.reset = None
+        self._lock = threading.Lock()
+
+    def update(self, headers):
+        remaining = headers.get('X-RateLimit-Remaining')
+        reset = headers.get('X-RateLimit-Reset')
+        if remaining is None:
+            return
+        with self._lock:
+            try:
+                self.remaining = int(remaining)
+                self.reset = float(reset) if reset is not None else None
+            except ValueError:
+                pass
+
+    def throttle(self):
+        """Sleep as needed before the next request"""
+        wait = self.next_wait()
+        if wait > 0:
+            time.sleep(wait)
+
+    def next_wait(self):
+        """Count the next request and return how long to wait before it,
+        for callers that cannot block in time.sleep, e.g. coroutines"""
+        with self._lock:
+            wait = 0.0
+            if self.remaining is not None and self.reset is not None:
+                until_reset = self.reset - time.time()
+                if until_reset > 0 and self.remaining < self.reserve:
+                    # spread what is left evenly over the rest of the window
+                    wait = until_reset / max(self.remaining, 1)
+                    if self.remaining <= 0:
+                        wait = until_reset
+                # count this request until the next response says otherwise
+                self.remaining -= 1
+        return wait
@@ -0,0 +1,156 @@
+import asyncio
+import importlib
+import logging
+
+import aiohttp
+import pytest
+from aiohttp import web
+
+async_rest = importlib.import_module('alpaca-trade-api.async_rest')
+common = importlib.import_module('alpaca-trade-api.common')
+retry = importlib.import_module('alpaca-trade-api.retry')
+AsyncREST, APIError = async_rest.AsyncREST, common.APIError
+
+
+def run_with_server(routes, test):
+    """Serve routes on a local stand-in for the API and run the coroutine
+    function test(api) against it"""
+    async def main():
+        app = web.Application()
+        app.add_routes(routes)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        policy = retry.RetryPolicy(max_retries=2, base_delay=0.01)
+        try:
+            async with AsyncREST(key_id='key', secret_key='secret',
+                                 base_url='http://127.0.0.1:{}'.format(port),
+                                 api_version='v2', rate_limit=1000,
+                                 retry_policy=policy) as api:
+                return await test(api)
+        finally:
+            await runner.cleanup()
+    return asyncio.run(main())
+
+
+def test_request_retries_throttled_responses():
+    calls = []
+
+    async def account(request):
+        calls.append(request.headers['APCA-API-KEY-ID'])
+        if len(calls) < 3:
+            return web.json_response({'message': 'slow down'}, status=429)
+        return web.json_response({'id': 'acct'})
+
+    result = run_with_server([web.get('/v2/account', account)],
+                             lambda api: api.get('/account'))
+    assert result == {'id': 'acct'}
+    assert calls == ['key'] * 3
+
+
+def test_request_gives_up_after_max_retries():
+    calls = []
+
+    async def account(request):
+        calls.append(1)
+        return web.json_response({'message': 'slow down'}, status=429)
+
+    with pytest.raises(aiohttp.ClientResponseError) as exc_info:
+        run_with_server([web.get('/v2/account', account)],
+                        lambda api: api.get('/account'))
+    assert exc_info.value.status == 429
+    assert len(calls) == 3
+
+
+def test_request_raises_api_errors():
+    async def order(request):
+        return web.json_response({'code': 40410000, 'message': 'order not found'}, status=404)
+
+    with pytest.raises(APIError) as exc_info:
+        run_with_server([web.get('/v2/orders/x', order)],
+                        lambda api: api.get('/orders/x'))
+    assert exc_info.value.code == 40410000
+
+
+def test_map_symbols_keeps_every_result():
+    async def asset(request):
+        symbol = request.match_info['symbol']
+        if symbol == 'NOPE':
+            return web.json_response({'code': 40410000, 'message': 'asset not found'},
+                                     status=404)
+        return web.json_response({'symbol': symbol})
+
+    async def test(api):
+        return await api.map_symbols(lambda symbol: api.get('/assets/' + symbol),
+                                     ['AAPL', 'NOPE', 'MSFT'])
+
+    results = run_with_server([web.get('/v2/assets/{symbol}', asset)], test)
+    assert list(results) == ['AAPL', 'NOPE', 'MSFT']
+    assert results['AAPL'] == {'symbol': 'AAPL'}
+    assert isinstance(results['NOPE'], APIError)
+
+
+def test_submit_orders_in_input_order():
+    async def submit(request):
+        order = await request.json()
+        if order['qty'] <= 0:
+            return web.json_response({'code': 40010001, 'message': 'qty must be > 0'},
+                                     status=422)
+        return web.json_response(dict(order, id='order-' + order['symbol']))
+
+    orders = [
+        dict(symbol='AAPL', qty=1, side='buy', type='market', time_in_force='day'),
+        dict(symbol='MSFT', qty=0, side='buy', type='market', time_in_force='day'),
+        dict(symbol='TSLA', qty=2, side='sell', type='limit', time_in_force='gtc',
+             limit_price=700),
+    ]
+    results = run_with_server([web.post('/v2/orders', submit)],
+                              lambda api: api.submit_orders(orders))
+    assert results[0].id == 'order-AAPL'
+    assert isinstance(results[1], APIError)
+    assert results[2].id == 'order-TSLA' and results[2].limit_price == 700
+
+
+def order_routes(orders, calls):
+    async def list_orders(request):
+        query = request.query
+        calls.append(dict(query))
+        assert query['direction'] == 'desc'
+        # until is inclusive, so the order at the page boundary comes back again
+        matching = [o for o in orders
+                    if query['after'] < o['submitted_at'] <= query['until']]
+        matching.sort(key=lambda o: o['submitted_at'], reverse=True)
+        return web.json_response(matching[:int(query['limit'])])
+    return [web.get('/v2/orders', list_orders)]
+
+
+def timestamp(second):
+    return '2020-09-14T13:{:02d}:{:02d}Z'.format(second // 60, second % 60)
+
+
+def test_list_orders_windows_pages_full_windows():
+    orders = [{'id': 'o{}'.format(i), 'submitted_at': timestamp(i)} for i in range(1, 1200)]
+    calls = []
+    windows = [(timestamp(0), timestamp(600)), (timestamp(600), timestamp(1200))]
+    result = run_with_server(
+        order_routes(orders, calls),
+        lambda api: api.list_orders_windows(windows, limit=250))
+    assert sorted(o.id for o in result) == sorted(o['id'] for o in orders)
+    # the first page of each window, then one more per full page
+    assert len(calls) == 6
+    assert {c['until'] for c in calls} >= {timestamp(600), timestamp(351), timestamp(102)}
+
+
+def test_list_orders_windows_stops_when_until_cannot_move(caplog):
+    orders = [{'id': 'o{}'.format(i), 'submitted_at': timestamp(30)} for i in range(20)]
+    calls = []
+    caplog.set_level(logging.WARNING)
+    result = run_with_server(
+        order_routes(orders, calls),
+        lambda api: api.list_orders_windows([(timestamp(0), timestamp(60))], limit=10))
+    # the second page starts at the same instant as the first one ended
+    assert len(calls) == 2
+    assert len(result) == 10
+    assert 'more than 10 orders submitted at' in caplog.text
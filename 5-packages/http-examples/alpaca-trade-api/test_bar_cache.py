@@ -0,0 +1,131 @@
+import importlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import requests
+
+bar_cache = importlib.import_module('alpaca-trade-api.bar_cache')
+entity = importlib.import_module('alpaca-trade-api.entity')
+BarCache, missing_ranges, merge_ranges = \
+    bar_cache.BarCache, bar_cache.missing_ranges, bar_cache.merge_ranges
+
+# one bar a minute
+T0 = 1600000000
+MINUTE = 60
+
+
+class FakeAPI(object):
+    """get_barset over a fixed list of minute bars. Like the API, start and
+    end are inclusive and a page holds the first limit bars."""
+
+    def __init__(self, count):
+        self.times = [T0 + i * MINUTE for i in range(count)]
+        self.calls = []
+
+    def raw_bars(self, limit, start, end):
+        start = int(pd.Timestamp(start).timestamp())
+        end = int(pd.Timestamp(end).timestamp())
+        self.calls.append((start, end))
+        return [{'t': t, 'o': 1.0, 'h': 2.0, 'l': 0.5, 'c': 1.5, 'v': t - T0}
+                for t in self.times if start <= t <= end][:limit]
+
+    def get_barset(self, symbol, timeframe, limit=None, start=None, end=None):
+        return entity.BarSet({symbol: self.raw_bars(limit, start, end)})
+
+
+def test_missing_ranges():
+    covered = [[10, 20], [30, 40]]
+    assert missing_ranges(0, 50, covered) == [(0, 10), (20, 30), (40, 50)]
+    assert missing_ranges(12, 18, covered) == []
+    assert missing_ranges(15, 35, covered) == [(20, 30)]
+    assert missing_ranges(0, 5, []) == [(0, 5)]
+
+
+def test_merge_ranges():
+    assert merge_ranges([[30, 40], [10, 20], [20, 25], [38, 50]]) == [[10, 25], [30, 50]]
+    assert merge_ranges([]) == []
+
+
+def test_get_bars_pages_then_reads_from_disk(tmp_path, monkeypatch):
+    monkeypatch.setattr(bar_cache, 'PAGE_LIMIT', 7)
+    api = FakeAPI(30)
+    cache = BarCache(api, str(tmp_path))
+    start, end = T0, T0 + 20 * MINUTE
+    bars = cache.get_bars('AAPL', 'minute', start, end)
+    # [start, end) is half open, the bar at end is not part of it
+    assert bars.columns['t'].tolist() == api.times[:20]
+    # full pages of 7 continue after the last bar, the inclusive end
+    # brings that bar back once more
+    assert len(api.calls) == 3
+    assert cache.coverage('AAPL', 'minute') == [[start, end]]
+
+    api.calls.clear()
+    inner = cache.get_bars('AAPL', 'minute', T0 + 5 * MINUTE, T0 + 8 * MINUTE)
+    assert api.calls == []
+    assert inner.columns['t'].tolist() == api.times[5:8]
+    assert inner.columns['v'].tolist() == [5 * MINUTE, 6 * MINUTE, 7 * MINUTE]
+
+
+def test_only_gaps_are_fetched_and_merged_without_duplicates(tmp_path):
+    api = FakeAPI(30)
+    cache = BarCache(api, str(tmp_path))
+    cache.fill('AAPL', 'minute', T0 + 10 * MINUTE, T0 + 15 * MINUTE)
+    api.calls.clear()
+    bars = cache.get_bars('AAPL', 'minute', T0, T0 + 25 * MINUTE)
+    assert api.calls == [(T0, T0 + 10 * MINUTE), (T0 + 15 * MINUTE, T0 + 25 * MINUTE)]
+    t = bars.columns['t']
+    # both gap ends overlap bars already on disk, each is kept once, sorted
+    assert t.tolist() == api.times[:25]
+    assert np.all(np.diff(t) > 0)
+    assert cache.coverage('AAPL', 'minute') == [[T0, T0 + 25 * MINUTE]]
+    assert sorted(os.listdir(str(tmp_path / 'minute' / 'AAPL'))) == \
+        ['c.npy', 'coverage.json', 'h.npy', 'l.npy', 'o.npy', 't.npy', 'v.npy']
+
+
+def test_future_is_never_marked_covered(tmp_path):
+    api = FakeAPI(30)
+    cache = BarCache(api, str(tmp_path))
+    now = int(time.time())
+    cache.fill('AAPL', 'minute', now - MINUTE, now + 3600)
+    (covered_start, covered_end), = cache.coverage('AAPL', 'minute')
+    assert covered_start == now - MINUTE
+    assert now <= covered_end < now + 10
+    # a range entirely in the future asks nothing and records nothing
+    api.calls.clear()
+    cache.fill('AAPL', 'minute', now + 3600, now + 7200)
+    assert api.calls == []
+    assert len(cache.coverage('AAPL', 'minute')) == 1
+
+
+def test_get_barset(tmp_path):
+    cache = BarCache(FakeAPI(10), str(tmp_path))
+    barset = cache.get_barset(['AAPL', 'MSFT'], 'minute', T0, T0 + 4 * MINUTE)
+    assert sorted(barset) == ['AAPL', 'MSFT']
+    assert [len(bars) for bars in barset.values()] == [4, 4]
+    assert list(barset.df.columns.levels[0]) == ['AAPL', 'MSFT']
+
+
+def test_cache_over_rest_get_barset(tmp_path):
+    rest = importlib.import_module('alpaca-trade-api.rest')
+    api = FakeAPI(12)
+    requested = []
+
+    def request(method, url, params=None, **opts):
+        # the bars endpoint of the data API, answered from FakeAPI
+        requested.append((method, url, params))
+        resp = requests.Response()
+        resp.status_code = 200
+        resp._content = json.dumps({params['symbols']: api.raw_bars(
+            params['limit'], params['start'], params['end'])}).encode()
+        return resp
+
+    client = rest.REST(key_id='key', secret_key='secret', base_url='https://paper-api.test')
+    client._session.request = request
+    bars = BarCache(client, str(tmp_path)).get_bars('AAPL', 'minute', T0, T0 + 10 * MINUTE)
+    assert bars.columns['t'].tolist() == api.times[:10]
+    method, url, params = requested[0]
+    assert method == 'GET' and url.endswith('/v1/bars/minute')
+    assert params['symbols'] == 'AAPL' and params['limit'] == bar_cache.PAGE_LIMIT
@@ -0,0 +1,14 @@
+import importlib
+
+common = importlib.import_module('alpaca-trade-api.common')
+
+
+def test_parse_error():
+    assert common.parse_error(b'{"code": 40410000, "message": "order not found"}') == {
+        'code': 40410000, 'message': 'order not found'}
+    assert common.parse_error(b'') is None
+    # not the API's error object
+    assert common.parse_error(b'<html>bad gateway, error code 502</html>') is None
+    assert common.parse_error(b'{"code": 4041') is None
+    assert common.parse_error(b'["code"]') is None
+    assert common.parse_error(b'{"message": "no code here", "detail": "code"}') is None
@@ -0,0 +1,95 @@
+import importlib
+
+import pandas as pd
+
+entity = importlib.import_module('alpaca-trade-api.entity')
+NY, Bars, BarSet = entity.NY, entity.Bars, entity.BarSet
+
+RAW = {
+    'AAPL': [
+        {'t': 1600000000, 'o': 110.5, 'h': 111.0, 'l': 110.0, 'c': 110.75, 'v': 1200},
+        {'t': 1600000060, 'o': 110.75, 'h': 112.0, 'l': 110.5, 'c': 111.5, 'v': 1.5,
+         'x': 'Q'},
+    ],
+    'MSFT': [
+        {'t': 1600000000, 'o': 200, 'h': 201, 'l': 199, 'c': 200, 'v': 300, 'n': 12},
+    ],
+}
+
+
+def reference_df(raw):
+    # how Bars.df was built when Bars held one Bar per raw dict
+    df = pd.DataFrame(raw, columns=('t', 'o', 'h', 'l', 'c', 'v'))
+    df.columns = ['time', 'open', 'high', 'low', 'close', 'volume']
+    df.set_index('time', inplace=True)
+    df.index = pd.to_datetime((df.index * 1e9).astype('int64'), utc=True).tz_convert(NY)
+    return df
+
+
+def test_bar_attributes_match_raw():
+    for raw in RAW.values():
+        bars = Bars(raw)
+        assert len(bars) == len(raw)
+        for bar, raw_bar in zip(bars, raw):
+            assert bar.t == pd.Timestamp(raw_bar['t'], unit='s', tz=NY)
+            for field in raw_bar:
+                if field != 't':
+                    assert getattr(bar, field) == raw_bar[field]
+    # a fractional volume is not truncated
+    assert Bars(RAW['AAPL'])[1].v == 1.5
+    # a string extra field, missing from the first bar
+    assert Bars(RAW['AAPL']).columns['x'].tolist() == [None, 'Q']
+
+
+def test_df_matches_reference():
+    for raw in RAW.values():
+        pd.testing.assert_frame_equal(Bars(raw).df, reference_df(raw))
+
+
+def test_barset_df_matches_reference():
+    dfs = []
+    for symbol, raw in RAW.items():
+        df = reference_df(raw)
+        df.columns = pd.MultiIndex.from_product([[symbol, ], df.columns])
+        dfs.append(df)
+    pd.testing.assert_frame_equal(BarSet(RAW).df, pd.concat(dfs, axis=1))
+
+
+ORDERS = [
+    {'id': 'a', 'symbol': 'AAPL', 'qty': '10', 'submitted_at': '2020-09-14T13:30:00.123456Z',
+     'filled_at': None, 'class': 'simple', 'legs': None},
+    {'id': 'b', 'symbol': 'MSFT', 'qty': '5', 'submitted_at': '2020-09-14T13:31:00Z',
+     'filled_at': '2020-09-14T13:31:01.5Z', 'class': 'simple'},
+]
+
+
+def test_from_list_matches_entities():
+    Order = entity.Order
+    records = Order.from_list(ORDERS)
+    assert [type(r).__name__ for r in records] == ['Order', 'Order']
+    assert all(isinstance(r, Order) for r in records)
+    for record, raw in zip(records, ORDERS):
+        plain = Order(raw)
+        for key in raw:
+            assert getattr(record, key) == getattr(plain, key), key
+        assert repr(record) == repr(plain)
+    assert isinstance(records[0].submitted_at, pd.Timestamp)
+    assert records[0].submitted_at == pd.Timestamp(ORDERS[0]['submitted_at'])
+    # a field only some records have
+    try:
+        records[1].legs
+    except AttributeError:
+        pass
+    else:
+        raise AssertionError('legs is not in the second order')
+    # one record class per entity and set of fields
+    assert type(Order.from_list(ORDERS)[0]) is type(records[0])
+    assert Order.from_list([]) == []
+
+
+def test_from_list_pickles_as_the_entity():
+    import pickle
+    record = entity.Order.from_list(ORDERS)[1]
+    copy = pickle.loads(pickle.dumps(record))
+    assert type(copy) is entity.Order
+    assert copy.filled_at == record.filled_at
@@ -0,0 +1,77 @@
+import importlib
+import time
+import types
+
+retry = importlib.import_module('alpaca-trade-api.retry')
+RetryPolicy, RateTracker = retry.RetryPolicy, retry.RateTracker
+
+
+def response(**headers):
+    return types.SimpleNamespace(headers=headers)
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv('APCA_RETRY_MAX', '5')
+    monkeypatch.setenv('APCA_RETRY_WAIT', '2')
+    monkeypatch.setenv('APCA_RETRY_CODES', '429,503')
+    policy = RetryPolicy.from_env()
+    assert policy.max_retries == 5
+    assert policy.base_delay == 2.0
+    assert policy.retry_codes == (429, 503)
+    assert RetryPolicy.from_env(max_retries=1).max_retries == 1
+
+
+def test_delay_is_jittered_below_the_cap():
+    policy = RetryPolicy(base_delay=1.0, max_delay=5.0)
+    for attempt in range(10):
+        for _ in range(20):
+            assert 0 <= policy.delay(attempt) <= min(5.0, 2 ** attempt)
+
+
+def test_retry_after_is_honored_in_full():
+    policy = RetryPolicy(max_delay=5.0)
+    assert policy.delay(0, response(**{'Retry-After': '60'})) == 60.0
+    # unparseable values fall back to the backoff
+    assert policy.delay(0, response(**{'Retry-After': 'soon'})) <= 1.0
+    assert policy.can_wait(response(**{'Retry-After': '60'}))
+
+
+def test_gives_up_on_a_longer_retry_after_than_allowed():
+    policy = RetryPolicy(max_retry_after=30)
+    assert policy.can_wait(response(**{'Retry-After': '30'}))
+    assert not policy.can_wait(response(**{'Retry-After': '31'}))
+    assert policy.can_wait(response())
+
+
+def test_can_retry_stops_after_max_retries():
+    policy = RetryPolicy(max_retries=2)
+    assert policy.can_retry('/orders', 0)
+    assert policy.can_retry('/orders', 1)
+    assert not policy.can_retry('/orders', 2)
+
+
+def test_endpoint_budget():
+    policy = RetryPolicy(max_retries=10, endpoint_budgets={'/orders': 2}, budget_window=0.2)
+    for _ in range(2):
+        assert policy.can_retry('/orders/123', 0)
+        policy.record_retry('/orders/123')
+    assert not policy.can_retry('/orders', 0)
+    # other endpoints have no budget
+    assert policy.can_retry('/positions', 0)
+    time.sleep(0.25)
+    assert policy.can_retry('/orders', 0)
+
+
+def test_rate_tracker_spreads_the_rest_of_the_window():
+    tracker = RateTracker(reserve=10)
+    assert tracker.next_wait() == 0
+    tracker.update({'X-RateLimit-Remaining': '100', 'X-RateLimit-Reset': str(time.time() + 10)})
+    assert tracker.next_wait() == 0
+    assert tracker.remaining == 99
+    tracker.update({'X-RateLimit-Remaining': '5', 'X-RateLimit-Reset': str(time.time() + 10)})
+    assert 1.5 < tracker.next_wait() <= 2.0
+    tracker.update({'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': str(time.time() + 10)})
+    assert 9 < tracker.next_wait() <= 10
+    # malformed headers keep the previous numbers
+    tracker.update({'X-RateLimit-Remaining': 'many'})
+    assert tracker.remaining == -1
@@ -0,0 +1,148 @@
+import collections
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# dispatch a little after the reset time, the server clock may lag ours
+RESET_SKEW = 1.0
+
+
+class EndpointQueue(object):
+    def __init__(self):
+        self.pending = collections.deque()
+        self.in_flight = 0
+
+
+class RateLimitScheduler(object):
+    """Queues requests per endpoint and runs each one on a thread pool as
+    soon as its endpoint's rate limit window allows.
+
+    get_limit(url) returns the endpoint's current limit, an object with
+    remaining and reset (epoch seconds) such as RateLimit.get_limit. An
+    endpoint that has used up its window only holds back its own queue,
+    requests to other endpoints keep being dispatched. get_limit may go to
+    the network (e.g. to initialize the limits), so it is never called while
+    holding the scheduler's lock.
+    """
+
+    def __init__(self, get_limit, max_workers=8):
+        self.get_limit = get_limit
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._queues = collections.OrderedDict()
+        self._cond = threading.Condition()
+        self._shutdown = False
+        # set whenever something happens the dispatcher has to look at
+        self._changed = False
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True)
+        self._dispatcher.start()
+
+    @staticmethod
+    def endpoint(url):
+        # the limit belongs to the resource, not to the query string
+        return url.split('?', 1)[0]
+
+    def submit(self, url, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) as a request to url, returns a Future"""
+        # resolved by the scheduler, the pool only runs the request once the
+        # endpoint allows it
+        item = (url, fn, args, kwargs, Future())
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError('cannot submit after shutdown')
+            self._queues.setdefault(self.endpoint(url), EndpointQueue()).pending.append(item)
+            self._changed = True
+            self._cond.notify()
+        return item[-1]
+
+    def _ready_at(self, limit, queue):
+        """0 if a request may go now, otherwise when to look again"""
+        now = time.time()
+        if limit.remaining - queue.in_flight > 0:
+            return 0
+        if limit.reset + RESET_SKEW <= now:
+            # the window has rolled over but the count is stale, send one
+            # request at a time until a response brings fresh numbers
+            return 0 if queue.in_flight == 0 else now + RESET_SKEW
+        return limit.reset + RESET_SKEW
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                self._changed = False
+                if self._shutdown and not self._queues:
+                    return
+                heads = [(key, queue.pending[0][0])
+                         for key, queue in self._queues.items() if queue.pending]
+            # outside the lock, so a slow lookup does not hold up submit()
+            # or the completion of running requests
+            limits = {}
+            for key, url in heads:
+                try:
+                    limits[key] = self.get_limit(url)
+                except Exception as exc:
+                    limits[key] = exc
+            with self._cond:
+                wake_at = None
+                for key, queue in list(self._queues.items()):
+                    limit = limits.get(key)
+                    if isinstance(limit, Exception):
+                        # the limit lookup failed, fail the request it was for
+                        future = queue.pending.popleft()[-1]
+                        if future.set_running_or_notify_cancel():
+                            future.set_exception(limit)
+                        limit = None
+                    while queue.pending and limit is not None:
+                        ready_at = self._ready_at(limit, queue)
+                        if ready_at:
+                            wake_at = min(wake_at or ready_at, ready_at)
+                            break
+                        self._start(key, queue, queue.pending.popleft())
+                    if not queue.pending and not queue.in_flight:
+                        del self._queues[key]
+                if self._shutdown and not self._queues:
+                    return
+                if not self._changed:
+                    timeout = max(wake_at - time.time(), 0.01) if wake_at else None
+                    self._cond.wait(timeout)
+
+    def _start(self, key, queue, item):
+        url, fn, args, kwargs, future = item
+        if not future.set_running_or_notify_cancel():
+            return
+        queue.in_flight += 1
+
+        def run():
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as exc:
+                future.set_exception(exc)
+            else:
+                future.set_result(result)
+            finally:
+                with self._cond:
+                    queue.in_flight -= 1
+                    # the response may have updated the limit, look again
+                    self._changed = True
+                    self._cond.notify()
+
+        logger.debug('Dispatching request to [%s]', url)
+        self._executor.submit(run)
+
+    def pending(self):
+        """Number of queued requests per endpoint"""
+        with self._cond:
+            return {key: len(queue.pending) for key, queue in self._queues.items()}
+
+    def shutdown(self, wait=True):
+        """Stop accepting requests; queued ones are still dispatched"""
+        with self._cond:
+            self._shutdown = True
+            self._changed = True
+            self._cond.notify()
+        if wait:
+            self._dispatcher.join()
+            self._executor.shutdown(wait=True)
+
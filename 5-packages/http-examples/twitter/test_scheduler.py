@@ -0,0 +1,80 @@
+import threading
+import time
+import types
+
+from .scheduler import RateLimitScheduler
+
+
+class FakeLimits(object):
+    """Per endpoint limits that every request uses up, like RateLimit"""
+
+    def __init__(self, **limits):
+        self.limits = {'/' + name: types.SimpleNamespace(remaining=remaining, reset=reset)
+                       for name, (remaining, reset) in limits.items()}
+        self.lock = threading.Lock()
+
+    def get_limit(self, url):
+        with self.lock:
+            limit = self.limits[url]
+            if limit.reset <= time.time():
+                # the window rolled over
+                limit.remaining, limit.reset = 10, time.time() + 900
+            return limit
+
+    def request(self, url):
+        with self.lock:
+            limit = self.limits[url]
+            assert limit.remaining > 0, 'request sent past the rate limit'
+            limit.remaining -= 1
+        return url, time.time()
+
+
+def test_exhausted_endpoint_does_not_block_others():
+    start = time.time()
+    limits = FakeLimits(slow=(1, start + 1.0), fast=(100, start + 900))
+    scheduler = RateLimitScheduler(limits.get_limit, max_workers=2)
+    slow = [scheduler.submit('/slow', limits.request, '/slow') for _ in range(2)]
+    fast = [scheduler.submit('/fast', limits.request, '/fast') for _ in range(5)]
+    # every /fast request completes while the second /slow one waits for the reset
+    assert all(f.result(timeout=0.5)[1] - start < 0.5 for f in fast)
+    assert slow[0].result(timeout=0.5)
+    assert not slow[1].done()
+    assert scheduler.pending()['/slow'] == 1
+    # dispatched once the window has rolled over
+    assert slow[1].result(timeout=3)[1] - start >= 1.0
+    scheduler.shutdown()
+
+
+def test_slow_limit_lookup_does_not_block_submit():
+    lookup_started = threading.Event()
+    release = threading.Event()
+
+    def get_limit(url):
+        lookup_started.set()
+        release.wait(2)
+        return types.SimpleNamespace(remaining=10, reset=0)
+
+    scheduler = RateLimitScheduler(get_limit)
+    first = scheduler.submit('/a', lambda: 'a')
+    assert lookup_started.wait(1)
+    began = time.time()
+    second = scheduler.submit('/b', lambda: 'b')
+    assert time.time() - began < 0.5
+    release.set()
+    assert first.result(timeout=2) == 'a' and second.result(timeout=2) == 'b'
+    scheduler.shutdown()
+
+
+def test_failed_limit_lookup_fails_the_request():
+    def get_limit(url):
+        raise RuntimeError('no limits')
+
+    scheduler = RateLimitScheduler(get_limit)
+    future = scheduler.submit('/a', lambda: 'a')
+    try:
+        future.result(timeout=2)
+    except RuntimeError as exc:
+        assert str(exc) == 'no limits'
+    else:
+        raise AssertionError('expected the lookup error')
+    scheduler.shutdown()
@@ -0,0 +1,168 @@
+import itertools
+import threading
+import time
+import types
+
+import pytest
+
+from .twitter import Api, USERS_SEARCH_PAGE_SIZE
+
+
+def make_api(max_workers=4):
+    # the bulk helpers only need the pool size, not credentials
+    api = Api.__new__(Api)
+    api._max_workers = max_workers
+    return api
+
+
+def timed_close(generator):
+    start = time.monotonic()
+    generator.close()
+    return time.monotonic() - start
+
+
+def test_prefetch_fetches_the_next_page_while_the_current_one_is_read():
+    next_page_requested = threading.Event()
+
+    def fetch(page):
+        if page == 2:
+            next_page_requested.set()
+        return [page * 10, page * 10 + 1], page + 1 if page < 3 else None
+
+    items = Api._prefetch_pages(fetch, 1)
+    assert next(items) == 10
+    assert next_page_requested.wait(1)
+    assert list(items) == [11, 20, 21, 30, 31]
+
+
+def test_prefetch_raises_the_fetch_error_in_order():
+    def fetch(page):
+        if page == 2:
+            raise ValueError('page 2')
+        return [page], page + 1
+
+    items = Api._prefetch_pages(fetch, 1)
+    assert next(items) == 1
+    with pytest.raises(ValueError, match='page 2'):
+        next(items)
+
+
+def test_prefetch_early_close_does_not_wait_for_the_next_page():
+    release = threading.Event()
+
+    def fetch(page):
+        if page > 1:
+            release.wait(10)
+        return [page], page + 1
+
+    items = Api._prefetch_pages(fetch, 1)
+    assert next(items) == 1
+    assert timed_close(items) < 0.5
+    release.set()
+
+
+def test_fan_out_pulls_items_lazily_within_max_in_flight():
+    pulled = []
+    running = []
+    peak = [0]
+    lock = threading.Lock()
+
+    def items():
+        for item in range(20):
+            pulled.append(item)
+            yield item
+
+    def work(item):
+        with lock:
+            running.append(item)
+            peak[0] = max(peak[0], len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(item)
+        return item * 2
+
+    results = make_api(max_workers=8).FanOut(work, items(), max_in_flight=3)
+    assert pulled == []
+    first = next(results)
+    # the first batch plus one replacement for the finished call
+    assert len(pulled) <= 4
+    rest = list(results)
+    assert sorted([first] + rest) == [(item, item * 2) for item in range(20)]
+    assert peak[0] <= 3
+
+
+def test_fan_out_raises_the_first_error():
+    def work(item):
+        if item == 3:
+            raise ValueError('item 3')
+        return item
+
+    with pytest.raises(ValueError, match='item 3'):
+        list(make_api().FanOut(work, range(10), max_in_flight=2))
+
+
+def test_fan_out_early_close_cancels_queued_calls():
+    release = threading.Event()
+    running = threading.Event()
+    started = []
+
+    def work(item):
+        started.append(item)
+        if item > 0:
+            running.set()
+            release.wait(10)
+        return item
+
+    results = make_api(max_workers=1).FanOut(work, range(10), max_in_flight=4)
+    assert next(results) == (0, 0)
+    assert running.wait(1)
+    assert timed_close(results) < 0.5
+    release.set()
+    time.sleep(0.05)
+    # item 1 was running, 2-4 were queued and never ran
+    assert started == [0, 1]
+
+
+def user(user_id):
+    return types.SimpleNamespace(id=user_id)
+
+
+def test_users_search_iter_clamps_count_and_stops_on_a_repeated_page():
+    calls = []
+
+    def search(term=None, page=None, count=None, include_entities=None):
+        calls.append((page, count))
+        # two full pages, after that twitter keeps repeating the last one
+        first = (min(page, 2) - 1) * count
+        return [user(i) for i in range(first, first + count)]
+
+    api = make_api()
+    api.GetUsersSearch = search
+    users = list(api.GetUsersSearchIter(term='python', count=100))
+    assert [u.id for u in users] == list(range(2 * USERS_SEARCH_PAGE_SIZE))
+    assert calls == [(1, 20), (2, 20), (3, 20)]
+
+
+def test_users_search_iter_ends_on_a_short_page():
+    def search(term=None, page=None, count=None, include_entities=None):
+        return [user(i) for i in range((page - 1) * count, (page - 1) * count + (count if page == 1 else 5))]
+
+    api = make_api()
+    api.GetUsersSearch = search
+    assert len(list(api.GetUsersSearchIter(term='python'))) == 25
+
+
+def test_users_lookup_iter_batches_ids():
+    batches = []
+
+    def lookup(user_id=None, include_entities=True):
+        batches.append(list(user_id))
+        # ids twitter does not know are missing from the response
+        return [user(i) for i in user_id if i % 50]
+
+    api = make_api()
+    api.UsersLookup = lookup
+    users = list(api.UsersLookupIter(iter(range(250))))
+    assert sorted(len(batch) for batch in batches) == [50, 100, 100]
+    assert sorted(u.id for u in users) == [i for i in range(250) if i % 50]
+    assert sorted(itertools.chain.from_iterable(batches)) == list(range(250))
@@ -1,7 +1,24 @@
 # https://github.com/bear/python-twitter
 
+import itertools
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
 import requests 
 
+from .scheduler import RateLimitScheduler
+
+logger = logging.getLogger(__name__)
+
+# users/search serves at most the first 1000 matches
+USERS_SEARCH_MAX_RESULTS = 1000
+# users/search returns at most this many users per page
+USERS_SEARCH_PAGE_SIZE = 20
+# users/lookup takes at most 100 ids per request
+USERS_LOOKUP_MAX = 100
+
 class Api(object):
     def __init__(self,
                  consumer_key=None,
@@ -11,7 +28,8 @@ class Api(object):
                  input_encoding=None,
                  request_headers=None,
                  timetout=None,
-                 proxies=None
+                 proxies=None,
+                 max_workers=8
                  ):
         # method for auth 
         self._auth = None 
@@ -21,9 +39,28 @@ class Api(object):
         self._initialize_default_parameters()
         # ression used
         self._session = requests.Session()
+        # rate limited requests wait in per endpoint queues, see SubmitRequest
+        self._max_workers = max_workers
+        self._scheduler = None
+        self._scheduler_lock = threading.Lock()
         
+    def SubmitRequest(self, url, verb, data=None, json=None):
+        """Queue a request behind the rate limit of its endpoint.
+        Returns a Future with the response. Requests to an endpoint that has
+        used up its window wait for the reset without holding up other
+        endpoints, which are served by a pool of max_workers threads.
+        """
+        if self._scheduler is None:
+            # worker threads of the bulk fetchers may get here at the same
+            # time, they must all share one scheduler
+            with self._scheduler_lock:
+                if self._scheduler is None:
+                    self._scheduler = RateLimitScheduler(self.CheckRateLimit, self._max_workers)
+        return self._scheduler.submit(
+            url, self._request_url, url, verb, data=data, json=json, scheduled=True)
+
     # request url based on verb, etc.
-    def _request_url(self, url, verb, data=None, json=None, enforce_auth=True):
+    def _request_url(self, url, verb, data=None, json=None, enforce_auth=True, scheduled=False):
         """Request a url.
         Args:
             url:
@@ -32,6 +69,9 @@ class Api(object):
                 Either POST or GET.
             data:
                 A dict of (str, unicode) key/value pairs.
+            scheduled:
+                True when called by the scheduler, which has already waited
+                for the endpoint's rate limit.
         Returns:
             A JSON object.
         """
@@ -39,16 +79,10 @@ class Api(object):
             if not self.__auth:
                 raise TwitterError("The twitter.Api instance must be authenticated.")
 
-            if url and self.sleep_on_rate_limit:
-                limit = self.CheckRateLimit(url)
-
-                if limit.remaining == 0:
-                    try:
-                        stime = max(int(limit.reset - time.time()) + 10, 0)
-                        logger.debug('Rate limited requesting [%s], sleeping for [%s]', url, stime)
-                        time.sleep(stime)
-                    except ValueError:
-                        pass
+            if url and self.sleep_on_rate_limit and not scheduled:
+                # wait in the endpoint's queue instead of sleeping here, so
+                # an exhausted endpoint does not block requests to others
+                return self.SubmitRequest(url, verb, data=data, json=json).result()
 
         if not data:
             data = {}
@@ -171,3 +205,113 @@ class Api(object):
         data = self._ParseAndCheckTwitter(resp.content.decode('utf-8'))
         return [User.NewFromJsonDict(x) for x in data]
 
+    # bulk fetchers
+    # every request still goes through _request_url, so the per endpoint rate
+    # limit queues apply to the prefetches and fan outs below as well
+
+    @staticmethod
+    def _prefetch_pages(fetch, state):
+        """Yield the items of every page, fetching the next page while the
+        caller works through the current one. fetch(state) returns
+        (items, next_state), a next_state of None ends the iteration."""
+        executor = ThreadPoolExecutor(max_workers=1)
+        try:
+            future = executor.submit(fetch, state)
+            while future is not None:
+                items, state = future.result()
+                future = executor.submit(fetch, state) if state is not None else None
+                for item in items:
+                    yield item
+        finally:
+            # the caller may stop early, do not wait for a page nobody reads
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def GetUsersSearchIter(self, term=None, count=20, include_entities=None):
+        """Yield every twitter.User matching term, page after page.
+        Twitter repeats the last page past the end of the results, so users
+        already seen are skipped, and a page without new users ends the
+        iteration."""
+        # a larger count would be cut to a page size by twitter, and the
+        # last page check below would end the iteration after one page
+        count = min(count, USERS_SEARCH_PAGE_SIZE)
+        # only touched by fetch, which runs for one page at a time
+        seen = set()
+
+        def fetch(page):
+            users = self.GetUsersSearch(term=term, page=page, count=count,
+                                        include_entities=include_entities)
+            new_users = [user for user in users if user.id not in seen]
+            seen.update(user.id for user in new_users)
+            more = (len(users) == count and new_users
+                    and page * count < USERS_SEARCH_MAX_RESULTS)
+            return new_users, page + 1 if more else None
+
+        return self._prefetch_pages(fetch, 1)
+
+    def GetFollowerIDsIter(self, user_id=None, screen_name=None, count=5000):
+        """Yield the ids of every follower of a user, following next_cursor"""
+        url = '%s/followers/ids.json' % self.base_url
+        parameters = {'count': count}
+        if user_id is not None:
+            parameters['user_id'] = user_id
+        elif screen_name is not None:
+            parameters['screen_name'] = screen_name
+
+        def fetch(cursor):
+            resp = self._request_url(url, 'GET', data=dict(parameters, cursor=cursor))
+            data = self._ParseAndCheckTwitter(resp.content.decode('utf-8'))
+            return data.get('ids', []), data.get('next_cursor') or None
+
+        return self._prefetch_pages(fetch, -1)
+
+    def UsersLookup(self, user_id=None, screen_name=None, include_entities=True):
+        """Fetch up to USERS_LOOKUP_MAX users by id or screen name in one request"""
+        parameters = {}
+        if user_id:
+            parameters['user_id'] = ','.join(str(u) for u in user_id)
+        if screen_name:
+            parameters['screen_name'] = ','.join(screen_name)
+        if not include_entities:
+            parameters['include_entities'] = 'false'
+        url = '%s/users/lookup.json' % self.base_url
+        resp = self._request_url(url, 'GET', data=parameters)
+        data = self._ParseAndCheckTwitter(resp.content.decode('utf-8'))
+        return [User.NewFromJsonDict(u) for u in data]
+
+    def FanOut(self, fn, items, max_in_flight=None):
+        """Run fn(item) for independent items (users, cursors, id batches) on a
+        pool of max_workers threads and yield (item, result) as each finishes.
+        Items are pulled lazily, at most max_in_flight calls are pending."""
+        max_in_flight = max_in_flight or 2 * self._max_workers
+        items = iter(items)
+        pending = {}
+        executor = ThreadPoolExecutor(max_workers=self._max_workers)
+        try:
+            for item in itertools.islice(items, max_in_flight):
+                pending[executor.submit(fn, item)] = item
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = pending.pop(future)
+                    for next_item in itertools.islice(items, 1):
+                        pending[executor.submit(fn, next_item)] = next_item
+                    yield item, future.result()
+        finally:
+            # on an error or early close drop the queued calls and do not
+            # wait for the running ones, their results are not wanted
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def UsersLookupIter(self, user_ids, include_entities=True, max_in_flight=None):
+        """Yield twitter.User for every id of user_ids (any iterable, e.g.
+        GetFollowerIDsIter), looked up USERS_LOOKUP_MAX at a time with the
+        batches spread over the worker pool. Users come back batch by batch
+        in completion order; ids Twitter does not return are skipped."""
+        ids = iter(user_ids)
+        batches = iter(lambda: list(itertools.islice(ids, USERS_LOOKUP_MAX)), [])
+
+        def lookup(batch):
+            return self.UsersLookup(user_id=batch, include_entities=include_entities)
+
+        for _, users in self.FanOut(lookup, batches, max_in_flight):
+            for user in users:
+                yield user
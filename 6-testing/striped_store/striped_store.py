@@ -0,0 +1,157 @@
+# striped_store.py
+# Counter and FakeDatabase from threading.py funnel every update through one
+# Lock, so adding threads only adds waiting. Here the keys are spread over
+# num_stripes locks by hash, threads updating different keys rarely meet,
+# and every stripe counts how often its lock was contended and for how long.
+# StripedCounter.batch() goes further: a thread adds up increments locally
+# and takes each stripe's lock once per flush instead of once per increment.
+import threading
+import time
+
+
+class LockStats:
+    def __init__(self):
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_time = 0.0
+
+    def as_dict(self):
+        return {
+            'acquisitions': self.acquisitions,
+            'contended': self.contended,
+            'wait_time': self.wait_time,
+        }
+
+
+class Stripe:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.data = {}
+        self.stats = LockStats()
+
+    def __enter__(self):
+        # try without blocking first so uncontended acquisitions cost nothing extra
+        if self._lock.acquire(blocking=False):
+            self.stats.acquisitions += 1
+            return self.data
+        start = time.perf_counter()
+        self._lock.acquire()
+        # the stats are only touched while holding the lock
+        self.stats.wait_time += time.perf_counter() - start
+        self.stats.contended += 1
+        self.stats.acquisitions += 1
+        return self.data
+
+    def __exit__(self, *exc_info):
+        self._lock.release()
+
+
+class StripedStore:
+    def __init__(self, num_stripes=16):
+        if num_stripes < 1:
+            raise ValueError("num_stripes must be at least 1")
+        self.stripes = [Stripe() for _ in range(num_stripes)]
+
+    def stripe_index(self, key):
+        return hash(key) % len(self.stripes)
+
+    def stripe_for(self, key):
+        return self.stripes[self.stripe_index(key)]
+
+    def get(self, key, default=None):
+        with self.stripe_for(key) as data:
+            return data.get(key, default)
+
+    def set(self, key, value):
+        with self.stripe_for(key) as data:
+            data[key] = value
+
+    def delete(self, key):
+        with self.stripe_for(key) as data:
+            del data[key]
+
+    def update(self, key, fn, default=None):
+        """Atomically replace the value of key with fn(value) and return it."""
+        with self.stripe_for(key) as data:
+            value = data[key] = fn(data.get(key, default))
+            return value
+
+    def snapshot(self):
+        """Copy of every key and value. Stripes are locked one at a time, so
+        this is consistent per key, not across keys."""
+        result = {}
+        for stripe in self.stripes:
+            with stripe as data:
+                result.update(data)
+        return result
+
+    def __len__(self):
+        return sum(len(stripe.data) for stripe in self.stripes)
+
+    def stripe_stats(self):
+        return [stripe.stats.as_dict() for stripe in self.stripes]
+
+    def contention(self):
+        """Lock statistics summed over all stripes."""
+        totals = {'acquisitions': 0, 'contended': 0, 'wait_time': 0.0}
+        for stats in self.stripe_stats():
+            for name in totals:
+                totals[name] += stats[name]
+        totals['contention_ratio'] = (totals['contended'] / totals['acquisitions']
+                                      if totals['acquisitions'] else 0.0)
+        return totals
+
+
+class StripedCounter(StripedStore):
+    def increment(self, key, amount=1):
+        with self.stripe_for(key) as data:
+            data[key] = data.get(key, 0) + amount
+
+    def value(self, key):
+        return self.get(key, 0)
+
+    def total(self):
+        return sum(self.snapshot().values())
+
+    def add_many(self, counts):
+        """Add a {key: amount} dict, locking each stripe once."""
+        by_stripe = {}
+        for key, amount in counts.items():
+            by_stripe.setdefault(self.stripe_index(key), []).append((key, amount))
+        for index, items in by_stripe.items():
+            with self.stripes[index] as data:
+                for key, amount in items:
+                    data[key] = data.get(key, 0) + amount
+
+    def batch(self, flush_every=1000):
+        return CounterBatch(self, flush_every)
+
+
+class CounterBatch:
+    """Per-thread buffer in front of a StripedCounter. Increments are added up
+    locally and flushed every flush_every calls and on exit from the with
+    block; until then other threads do not see them."""
+
+    def __init__(self, counter, flush_every=1000):
+        self.counter = counter
+        self.flush_every = flush_every
+        self.pending = {}
+        self.calls = 0
+
+    def increment(self, key, amount=1):
+        self.pending[key] = self.pending.get(key, 0) + amount
+        self.calls += 1
+        if self.calls >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.counter.add_many(self.pending)
+        self.pending = {}
+        self.calls = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
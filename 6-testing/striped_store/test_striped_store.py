@@ -0,0 +1,56 @@
+import threading
+
+import pytest
+
+from striped_store import StripedCounter, StripedStore
+
+
+def run_threads(target, count=8):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+
+def test_concurrent_increments_are_not_lost():
+    counter = StripedCounter(num_stripes=4)
+
+    def worker(n):
+        for i in range(5000):
+            counter.increment('key-{}'.format(i % 10))
+    run_threads(worker)
+    stats = counter.contention()
+    assert stats['acquisitions'] == 8 * 5000
+    assert 0 <= stats['contention_ratio'] <= 1
+    assert counter.total() == 8 * 5000
+    assert counter.value('key-3') == 8 * 500
+
+
+def test_batched_increments_flush_on_exit():
+    counter = StripedCounter()
+
+    def worker(n):
+        with counter.batch(flush_every=300) as batch:
+            for i in range(1000):
+                batch.increment(i % 7)
+    run_threads(worker)
+    assert counter.snapshot() == {k: 8 * sum(1 for i in range(1000) if i % 7 == k)
+                                  for k in range(7)}
+    # far fewer lock acquisitions than increments
+    assert counter.contention()['acquisitions'] < 8 * 1000 / 10
+
+
+def test_store_get_set_update():
+    store = StripedStore(num_stripes=3)
+    store.set('a', 1)
+    assert store.get('a') == 1
+    assert store.get('missing', 'default') == 'default'
+    assert store.update('b', lambda v: v + [1], default=[]) == [1]
+    store.delete('a')
+    assert store.snapshot() == {'b': [1]}
+    assert len(store) == 1
+    with pytest.raises(KeyError):
+        store.delete('a')
+    with pytest.raises(ValueError):
+        StripedStore(num_stripes=0)
@@ -391,6 +391,10 @@ class FakeDatabase:
         logging.debug("Thread %s after release", name)
         logging.info("Thread %s: finishing update", name)
 
+# one lock serializes every update no matter which value it touches; see
+# striped_store/striped_store.py for keys spread over several locks, with
+# per-thread batching and lock contention counts
+
 '''
 RLock
 '''